@@ -1,37 +1,235 @@
-import random
 import time
 import os
+import select
+import signal
 import sys
 
+import numpy as np
+
 # Configuration constants
 MATRIX_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789!@#$%^&*()_+-=[]{}|;:,.<>?"
 GREEN_SHADES = ['\033[32m', '\033[92m', '\033[36m']  # dark green, bright green, cyan
 RESET_COLOR = '\033[0m'
 CLEAR_SCREEN = '\033[2J\033[H'
-DROP_SPEED = 0.05
+CURSOR_HOME = '\033[H'
+DROP_SPEED = 0.05  # seconds per simulation step (fixed timestep)
+MAX_CATCH_UP_STEPS = 5  # steps simulated at most per frame before the clock is reset
+NON_BLOCKING_OUTPUT = True  # drop frames instead of stalling on a slow terminal
+WRITE_CHUNK = 4096  # bytes per os.write once select reports stdout writable (PIPE_BUF on Linux)
 MIN_TRAIL_LENGTH = 5
 MAX_TRAIL_LENGTH = 25
 SPAWN_PROBABILITY = 0.5
 MAX_DROPS = 150
+DIFF_OUTPUT = True  # send only changed cells instead of the whole screen every frame
+FULL_REDRAW_RATIO = 0.5  # redraw everything when more than this share of cells changed
+RUN_MERGE_GAP = 4  # unchanged cells re-sent to join two runs, cheaper than a cursor move
+
+CHAR_CODES = np.array([ord(char) for char in MATRIX_CHARS], dtype='<u4')
+BLANK = ord(' ')
+
+class MatrixRain:
+    """All drops as parallel NumPy arrays plus persistent char and color grids
+
+    Drop i covers rows int(y[i]) - k, k < length[i], of column x[i]. Stamping every drop into
+    the grids is one fancy-indexed write, and the frame is serialized per run of equal color
+    instead of per cell.
+    """
+
+    def __init__(self, width, height, seed=None):
+        self.width = width
+        self.height = height
+        self.rng = np.random.default_rng(seed)
+
+        # Drop state, the first `count` entries are live (in spawn order, later drops draw on top)
+        self.count = 0
+        self.x = np.zeros(MAX_DROPS, dtype=np.intp)
+        self.y = np.zeros(MAX_DROPS)
+        self.length = np.zeros(MAX_DROPS, dtype=np.intp)
+        self.speed = np.zeros(MAX_DROPS)
+        self.char_change_counter = np.zeros(MAX_DROPS, dtype=np.intp)  # Dodano za kontrolu
+        self.chars = np.zeros((MAX_DROPS, MAX_TRAIL_LENGTH), dtype='<u4')
+
+        # ORIGINALNA FORMULA ZA BRIGHTNESS, tabulated as shade_table[length, i]
+        self.offsets = np.arange(MAX_TRAIL_LENGTH)
+        lengths = np.maximum(np.arange(MAX_TRAIL_LENGTH + 1), 1)[:, None]
+        intensity = np.maximum(0, 2 - self.offsets / (lengths / 3))
+        self.shade_table = np.minimum(2, intensity.astype(np.uint8))
+
+        # Frame grids, reused every frame
+        self.screen = np.full((height, width), BLANK, dtype='<u4')
+        self.colors = np.zeros((height, width), dtype=np.uint8)
+        self.span_start = np.zeros(height * width, dtype=bool)
+        # Escape prefix per span: its color, or end the row first when the span starts a new row
+        self.span_prefixes = GREEN_SHADES + [RESET_COLOR + '\n' + shade for shade in GREEN_SHADES]
+
+    def spawn(self):
+        if self.count >= MAX_DROPS:
+            return
+        i = self.count
+        self.x[i] = self.rng.integers(0, self.width)
+        self.y[i] = 0
+        self.length[i] = self.rng.integers(MIN_TRAIL_LENGTH, MAX_TRAIL_LENGTH, endpoint=True)
+        self.speed[i] = self.rng.uniform(0.8, 1.5)
+        self.char_change_counter[i] = 0
+        self.chars[i] = self.rng.choice(CHAR_CODES, MAX_TRAIL_LENGTH)
+        self.count += 1
 
-class MatrixDrop:
-    def __init__(self, x, y, length):
-        self.x = x
-        self.y = y
-        self.length = length
-        self.chars = [random.choice(MATRIX_CHARS) for _ in range(length)]
-        self.speed = random.uniform(0.8, 1.5)
-        self.char_change_counter = 0  # Dodano za kontrolu
-    
     def update(self):
-        self.y += self.speed
-        
-        # ORIGINALNA LOGIKA - samo optimizovano
-        self.char_change_counter += 1
-        if self.char_change_counter > 5 and random.random() < 0.1:  # Manje CPU load
-            idx = random.randint(0, self.length - 1)
-            self.chars[idx] = random.choice(MATRIX_CHARS)
-            self.char_change_counter = 0
+        n = self.count
+        self.y[:n] += self.speed[:n]
+
+        # ORIGINALNA LOGIKA - change one character of a drop, at most every 6 frames
+        counter = self.char_change_counter[:n]
+        counter += 1
+        glitch = np.flatnonzero((counter > 5) & (self.rng.random(n) < 0.1))
+        self.chars[glitch, self.rng.integers(0, self.length[glitch])] = self.rng.choice(CHAR_CODES, glitch.size)
+        counter[glitch] = 0
+
+        # remove drops that have fallen off screen, keeping the order of the rest
+        keep = np.flatnonzero(self.y[:n] - self.length[:n] <= self.height)
+        if keep.size < n:
+            for array in (self.x, self.y, self.length, self.speed, self.char_change_counter, self.chars):
+                array[:keep.size] = array[keep]
+            self.count = keep.size
+
+    def stamp(self):
+        """Write every visible drop character and its shade into the grids"""
+        n = self.count
+        self.screen.fill(BLANK)
+        self.colors.fill(0)
+        rows = self.y[:n, None].astype(np.intp) - self.offsets
+        visible = (self.offsets < self.length[:n, None]) & (rows >= 0) & (rows < self.height)
+        drop_index, offset = np.nonzero(visible)  # drop-major, so later drops overwrite earlier ones
+        rows, columns = rows[visible], self.x[drop_index]
+        self.screen[rows, columns] = self.chars[drop_index, offset]
+        self.colors[rows, columns] = self.shade_table[self.length[drop_index], offset]
+
+    def encode(self):
+        """The grids as ANSI text, one color code per run of equally shaded cells"""
+        flat = self.colors.ravel()
+        np.not_equal(flat[1:], flat[:-1], out=self.span_start[1:])
+        self.span_start[::self.width] = True
+        starts = np.flatnonzero(self.span_start)
+        ends = np.append(starts[1:], flat.size)
+        prefixes = flat[starts] + len(GREEN_SHADES) * (starts % self.width == 0)
+        prefixes[0] -= len(GREEN_SHADES)  # no line break before the first row
+
+        text = self.screen.tobytes().decode('utf-32-le')
+        span_prefixes = self.span_prefixes
+        parts = [span_prefixes[prefix] + text[start:end]
+                 for prefix, start, end in zip(prefixes.tolist(), starts.tolist(), ends.tolist())]
+        parts.append(RESET_COLOR)
+        return ''.join(parts)
+
+class DiffRenderer:
+    """Terminal output that only sends cells changed since the previously emitted frame
+
+    Changed cells are grouped into runs per row (runs closer than RUN_MERGE_GAP are joined), and
+    each run is written after one cursor-positioning sequence. When most of the screen changed
+    a full frame is cheaper, so it falls back to a full redraw.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.screen = np.full((height, width), BLANK, dtype='<u4')
+        self.colors = np.zeros((height, width), dtype=np.uint8)
+        self.valid = False  # whether the terminal shows self.screen / self.colors
+
+    def invalidate(self):
+        self.valid = False
+
+    def render(self, rain):
+        """Output that turns the last emitted frame into the rain's current grids"""
+        if not DIFF_OUTPUT or not self.valid:
+            output = CLEAR_SCREEN + rain.encode()
+        else:
+            output = self.encode_changes(rain)
+        np.copyto(self.screen, rain.screen)
+        np.copyto(self.colors, rain.colors)
+        self.valid = True
+        return output
+
+    def encode_changes(self, rain):
+        width, size = self.width, self.width * self.height
+        changed = rain.screen != self.screen
+        changed |= (rain.colors != self.colors) & (rain.screen != BLANK)  # a blank's color is invisible
+        cells = np.flatnonzero(changed)
+        if cells.size == 0:
+            return ''
+        if cells.size > FULL_REDRAW_RATIO * size:
+            return CURSOR_HOME + rain.encode()
+
+        # Runs of changed cells within a row, bridging short unchanged gaps
+        breaks = (np.diff(cells) > RUN_MERGE_GAP + 1) | (np.diff(cells // width) != 0)
+        run_starts = cells[np.concatenate(([True], breaks))]
+        run_ends = cells[np.concatenate((breaks, [True]))] + 1
+
+        # Split runs where the shade changes, each piece is one color code plus its text
+        flat = rain.colors.ravel()
+        coverage = np.zeros(size + 1, dtype=np.int32)
+        coverage[run_starts] += 1
+        coverage[run_ends] -= 1
+        in_run = np.cumsum(coverage[:-1]) > 0
+        piece_start = np.zeros(size, dtype=bool)
+        piece_start[1:] = (flat[1:] != flat[:-1]) & in_run[1:]
+        piece_start[run_starts] = True
+        starts = np.flatnonzero(piece_start)
+        run_index = np.searchsorted(run_starts, starts, side='right') - 1
+        ends = np.minimum(np.append(starts[1:], size), run_ends[run_index])
+        moves = starts == run_starts[run_index]
+        piece_colors = flat[starts]
+        recolor = np.concatenate(([True], piece_colors[1:] != piece_colors[:-1]))
+
+        text = rain.screen.tobytes().decode('utf-32-le')
+        parts = []
+        for start, end, color, move, new_color in zip(starts.tolist(), ends.tolist(), piece_colors.tolist(),
+                                                      moves.tolist(), recolor.tolist()):
+            if move:
+                parts.append(f'\033[{start // width + 1};{start % width + 1}H')
+            if new_color:
+                parts.append(GREEN_SHADES[color])
+            parts.append(text[start:end])
+        parts.append(RESET_COLOR)
+        return ''.join(parts)
+
+class TerminalWriter:
+    """Sends whole frames to stdout with os.write, without stalling on a slow terminal
+
+    A frame is encoded to bytes once and written in WRITE_CHUNK pieces, each only after select
+    reports stdout writable. A terminal that can't keep up leaves the rest pending; it is sent
+    first, and the caller drops frames until `flush()` reports the terminal caught up. The
+    descriptor stays blocking: O_NONBLOCK would be shared with the shell and outlive a killed
+    process.
+    """
+
+    def __init__(self):
+        sys.stdout.flush()  # anything printed before goes out first
+        self.fd = sys.stdout.fileno()
+        self.pending = memoryview(b'')
+        self.poll = NON_BLOCKING_OUTPUT
+        if self.poll:
+            try:
+                select.select([], [self.fd], [], 0)
+            except (OSError, ValueError):
+                self.poll = False  # e.g. Windows consoles, writes just block
+
+    def flush(self, block=False):
+        """Send as much pending output as the terminal accepts; True once nothing is pending"""
+        while self.pending:
+            if self.poll and not block and not select.select([], [self.fd], [], 0)[1]:
+                return False
+            written = os.write(self.fd, self.pending[:WRITE_CHUNK])
+            self.pending = self.pending[written:]
+        return True
+
+    def write(self, text):
+        self.pending = memoryview(text.encode('utf-8'))
+        self.flush()
+
+    def close(self):
+        """Finish the last frame"""
+        self.flush(block=True)
 
 def get_terminal_size():
     try:
@@ -46,48 +244,28 @@ def hide_cursor():
 def show_cursor():
     print('\033[?25h', end='')
 
-def draw_matrix(drops, width, height):
-    # ORIGINALNA LOGIKA - samo optimizovana
-    screen = [[' ' for _ in range(width)] for _ in range(height)]
-    colors = [[0 for _ in range(width)] for _ in range(height)]
-    
-    # render each drop
-    for drop in drops:
-        for i, char in enumerate(drop.chars):
-            y_pos = int(drop.y) - i
-            if 0 <= y_pos < height and 0 <= drop.x < width:
-                screen[y_pos][drop.x] = char
-                # ORIGINALNA FORMULA ZA BRIGHTNESS
-                intensity = max(0, 2 - (i / (drop.length / 3)))
-                colors[y_pos][drop.x] = min(2, int(intensity))
-    
-    # OPTIMIZOVAN OUTPUT - jedan print umesto clear + loop
-    output_lines = []
-    for row_idx, row in enumerate(screen):
-        line_parts = []
-        current_color = None
-        
-        for col_idx, char in enumerate(row):
-            color_code = GREEN_SHADES[colors[row_idx][col_idx]]
-            if color_code != current_color:
-                if current_color is not None:
-                    line_parts.append(RESET_COLOR)
-                line_parts.append(color_code)
-                current_color = color_code
-            line_parts.append(char)
-        
-        if current_color is not None:
-            line_parts.append(RESET_COLOR)
-        
-        output_lines.append(''.join(line_parts))
-    
-    # JEDAN PRINT UMESTO MNOGO - smanjuje treperenje
-    print(CLEAR_SCREEN + '\n'.join(output_lines), end='')
-    sys.stdout.flush()
+def draw_matrix(rain, renderer, writer):
+    rain.stamp()
+    # JEDAN WRITE UMESTO MNOGO - smanjuje treperenje
+    writer.write(renderer.render(rain))
+
+def step_matrix(rain):
+    # ORIGINALNA SPAWN LOGIKA - samo dodato ograničenje
+    if rain.count < MAX_DROPS and rain.rng.random() < SPAWN_PROBABILITY:
+        rain.spawn()
+    rain.update()
+
+def exit_on_signal(signum, frame):
+    # Unwind through main's finally, which restores the cursor and colors
+    raise SystemExit(128 + signum)
 
 def main():
+    for name in ("SIGTERM", "SIGHUP"):
+        if hasattr(signal, name):  # no SIGHUP on Windows
+            signal.signal(getattr(signal, name), exit_on_signal)
     width, height = get_terminal_size()
-    drops = []
+    rain = MatrixRain(width, height)
+    renderer = DiffRenderer(width, height)
     
     # Setup terminal
     hide_cursor()
@@ -95,30 +273,37 @@ def main():
     print("Starting Matrix simulation... Press Ctrl+C to exit")
     time.sleep(2)
     
+    writer = TerminalWriter()
+    steps = shown = 0
     try:
+        next_step = time.perf_counter()
         while True:
-            # ORIGINALNA SPAWN LOGIKA - samo dodato ograničenje
-            if len(drops) < MAX_DROPS and random.random() < SPAWN_PROBABILITY:
-                x = random.randint(0, width - 1)
-                length = random.randint(MIN_TRAIL_LENGTH, MAX_TRAIL_LENGTH)
-                drops.append(MatrixDrop(x, 0, length))
+            # Fixed timestep: one simulation step per DROP_SPEED of elapsed time, however long
+            # drawing and writing took
+            due = 0
+            while time.perf_counter() >= next_step and due < MAX_CATCH_UP_STEPS:
+                step_matrix(rain)
+                next_step += DROP_SPEED
+                due += 1
+            if due == MAX_CATCH_UP_STEPS:
+                next_step = max(next_step, time.perf_counter())  # far behind, don't try to catch up
+            steps += due
             
-            # ORIGINALNA UPDATE LOGIKA
-            for drop in drops[:]:
-                drop.update()
-                # remove drops that have fallen off screen
-                if drop.y - drop.length > height:
-                    drops.remove(drop)
+            # Draw only the latest state, and only once the terminal took the previous frame
+            if due and writer.flush():
+                draw_matrix(rain, renderer, writer)
+                shown += 1
             
-            draw_matrix(drops, width, height)
-            time.sleep(DROP_SPEED)
+            time.sleep(max(0, next_step - time.perf_counter()))
             
     except KeyboardInterrupt:
         pass
     finally:
+        writer.close()
         show_cursor()
         print(CLEAR_SCREEN)
         print("Matrix simulation terminated.")
+        print(f"{shown} of {steps} frames shown, {steps - shown} dropped.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
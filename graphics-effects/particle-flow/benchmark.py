@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""Benchmark suite for the particle flow hot paths
+
+Runs every scenario headlessly with a fixed seed and reports frames per second plus
+allocation counts (tracemalloc) as JSON, so runs can be diffed between commits.
+
+    python benchmark.py --quick
+    python benchmark.py --output results.json
+    python benchmark.py --output new.json --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pygame
+from PIL import Image
+
+import patterns
+import preprocess_cache
+from main import (BLUE_CHANNEL, DENSITY_RADIUS, RED_CHANNEL, SPRITE_ATLAS, ParticleFlowEffect, ParticleRasterizer,
+                  TrailLayer)
+
+# Configuration constants
+SEED = 1234
+PARTICLE_COUNTS = (3000, 30000, 100000)
+WINDOW_SIZES = ((600, 804), (1920, 1080))
+DETAILS = (8, 16, 32)
+BACKENDS = ("raster", "sprites")
+PARTICLE_STATES = ("float32", "fixed")
+STATE_PARTICLE_COUNTS = (100000, 1000000)
+QUICK_STATE_PARTICLE_COUNTS = (100000,)
+QUICK_PARTICLE_COUNTS = (3000, 30000)
+QUICK_WINDOW_SIZES = ((600, 804),)
+QUICK_DETAILS = (16,)
+SCALAR_UPDATE_LIMIT = 3000  # Particle.update is per-object, only run it at small counts
+FRAMES = 60
+WARMUP_FRAMES = 5
+ALLOCATION_FRAMES = 5
+REGRESSION_TOLERANCE = 0.15
+RESULT_FIELDS = ("frames", "fps", "ms_per_frame", "alloc_peak_kb", "alloc_blocks")
+DISPLAY_DEPTHS = (24, 16)  # non-32-bit screens the raster back end must still draw correctly
+
+
+def measure(step, frames=FRAMES, warmup=WARMUP_FRAMES, allocation_frames=ALLOCATION_FRAMES):
+    """Time `step` and count its allocations in a separate tracemalloc pass"""
+    for _ in range(warmup):
+        step()
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        step()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    peak_total, blocks_total = 0, 0
+    for _ in range(allocation_frames):
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        step()
+        peak_total += tracemalloc.get_traced_memory()[1] - baseline
+        after = tracemalloc.take_snapshot()
+        blocks_total += sum(stat.count_diff for stat in after.compare_to(before, "lineno") if stat.count_diff > 0)
+    tracemalloc.stop()
+
+    return {
+        "frames": frames,
+        "fps": round(frames / elapsed, 2),
+        "ms_per_frame": round(elapsed / frames * 1000, 4),
+        "alloc_peak_kb": round(peak_total / allocation_frames / 1024, 1),
+        "alloc_blocks": blocks_total // allocation_frames,
+    }
+
+
+def check_display_depths(seed, size=(160, 120), count=200):
+    """Render raster particles and trails to DISPLAY_DEPTHS screens; errors versus 32-bit beyond each format's precision"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    x = rng.uniform(0, width, count).astype(np.float32)
+    y = rng.uniform(0, height, count).astype(np.float32)
+    alpha = rng.uniform(0, 1, count).astype(np.float32)
+    errors = []
+    for name, layer in (("particles", ParticleRasterizer(width, height)), ("trails", TrailLayer(width, height))):
+        layer.splat(x, y, alpha, RED_CHANNEL)
+        layer.splat(x + 3, y, alpha, BLUE_CHANNEL)
+        reference = pygame.Surface(size, 0, 32)
+        layer.present(reference)
+        expected = pygame.surfarray.array3d(reference).astype(np.int32)
+
+        for depth in DISPLAY_DEPTHS:
+            screen = pygame.Surface(size, 0, depth)
+            layer.present(screen)
+            difference = np.abs(pygame.surfarray.array3d(screen).astype(np.int32) - expected).max(axis=(0, 1))
+            allowed = [(1 << loss) - 1 for loss in screen.get_losses()[:3]]
+            if np.any(difference > allowed):
+                errors.append(f"{name} on a {depth}-bit screen differ from 32-bit by {difference.tolist()} "
+                              f"(allowed {allowed})")
+    return errors
+
+
+def write_test_image(directory, width, height):
+    """A JPEG photo stand-in at twice the window size, so loading has to decode and resize"""
+    path = os.path.join(directory, "benchmark.jpg")
+    brightness = (patterns.spiral(width * 2, height * 2) * 255).clip(0, 255).astype(np.uint8)
+    Image.fromarray(brightness).convert("RGB").save(path, quality=90)
+    return path
+
+
+def prepare(effect, count, detail, seed, enable_3d=False, backend="raster", state="float32"):
+    effect.seed = seed
+    effect.particle_count = count
+    effect.detail = detail
+    effect.enable_3d = enable_3d
+    effect.render_backend = backend
+    effect.particle_state = state
+    effect.process_image()
+    effect.init_particles()
+    effect.persistent_trail_surface.fill((0, 0, 0, 0))
+
+
+def run_size(size, counts, details, frames, seed, results, state_counts):
+    effect = ParticleFlowEffect(headless=True, size=size)
+    width, height = size
+
+    def record(name, step, **params):
+        result = {"benchmark": name, "width": width, "height": height, **params, **measure(step, frames)}
+        results.append(result)
+        extras = " ".join(f"{key}={value}" for key, value in params.items())
+        print(f"{name:<22} {width}x{height} {extras:<46} {result['fps']:>9.1f} fps "
+              f"{result['alloc_peak_kb']:>9.1f} KB {result['alloc_blocks']:>6} blocks")
+
+    # Image processing - independent of the particle count
+    patterns.ENABLE_CACHE = False
+    record("load_default_image", effect.load_default_image, detail=effect.detail)
+    patterns.ENABLE_CACHE = True
+    effect.load_default_image()
+    record("load_default_image", effect.load_default_image, detail=effect.detail, cached=True)
+    with tempfile.TemporaryDirectory() as directory:
+        image_path = write_test_image(directory, width, height)
+        cache_dir, preprocess_cache.CACHE_DIR = preprocess_cache.CACHE_DIR, os.path.join(directory, "cache")
+        preprocess_cache.ENABLE_CACHE = False
+        record("load_image", lambda: effect.load_image(image_path, size), detail=effect.detail)
+        preprocess_cache.ENABLE_CACHE = True
+        effect.load_image(image_path, size)
+        record("load_image", lambda: effect.load_image(image_path, size), detail=effect.detail, cached=True)
+        preprocess_cache.CACHE_DIR = cache_dir
+    for detail in details:
+        prepare(effect, counts[0], detail, seed)
+        record("process_image", effect.process_image, detail=detail)
+        record("render_image_grid", effect.render_image_grid, detail=detail)
+        record("render_brightness", effect.render_brightness, detail=detail)
+        for name in ("draw_step_1", "draw_step_2"):
+            # Static steps skip frames whose layer is already on screen, so force a real draw:
+            # cold renders the layer again, cached blits the stored one
+            draw = getattr(effect, name)
+
+            def cold():
+                effect.layers.invalidate()
+                effect.screen_layer = None
+                draw()
+
+            def cached():
+                effect.screen_layer = None
+                draw()
+
+            record(name, cold, detail=detail)
+            record(name, cached, detail=detail, cached=True)
+
+    # Simulation
+    for count in counts:
+        for detail in details:
+            prepare(effect, count, detail, seed)
+            record("ParticleSystem.update", lambda: effect.particle_system.update(effect.brightness_grid),
+                   particles=count, detail=detail)
+        if count <= SCALAR_UPDATE_LIMIT:
+            prepare(effect, count, details[0], seed)
+            grid = effect.brightness_grid
+            views = effect.particle_system.views()
+
+            def scalar_update():
+                for particle in views:
+                    particle.update(grid, grid.shape[1], grid.shape[0])
+
+            record("Particle.update", scalar_update, particles=count, detail=details[0])
+
+    # Particle state layouts: float32 arrays vs fixed point, memory and update/draw speed
+    for count in state_counts:
+        for state in PARTICLE_STATES:
+            prepare(effect, count, details[0], seed, state=state)
+            system, grid, flow = effect.particle_system, effect.brightness_grid, effect.flow_field.vectors
+            bytes_per_particle = system.nbytes // count
+            record("state_update", lambda: system.update(grid, flow), particles=count, state=state,
+                   bytes_per_particle=bytes_per_particle)
+            record("state_draw_step_4", effect.draw_step_4, particles=count, state=state,
+                   bytes_per_particle=bytes_per_particle)
+        effect.particle_system = system = None
+
+    # Neighbor queries
+    for count in counts:
+        prepare(effect, count, details[0], seed)
+        effect.current_step = 7  # static steps pause the simulation
+        for _ in range(WARMUP_FRAMES):
+            effect.update()
+        system, spatial_hash = effect.particle_system, effect.spatial_hash
+        record("SpatialHash.build", lambda: spatial_hash.build(system.x, system.y), particles=count)
+        record("neighbor_counts", lambda: spatial_hash.neighbor_counts(DENSITY_RADIUS), particles=count)
+
+    # Particle draw steps
+    for count in counts:
+        for enable_3d in (False, True):
+            for backend in BACKENDS:
+                for step in (3, 4, 5, 6, 7):
+                    prepare(effect, count, details[0], seed, enable_3d, backend)
+                    SPRITE_ATLAS.reset_stats()
+                    draw = getattr(effect, f"draw_step_{step}")
+                    record(f"draw_step_{step}", draw, particles=count, mode="3d" if enable_3d else "2d",
+                           backend=backend)
+
+    if effect.worker_pool is not None:
+        effect.worker_pool.close()
+
+
+def compare(results, baseline_path, tolerance):
+    """Print scenarios whose fps dropped by more than `tolerance`; returns the regression count"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+
+    def key(result):
+        return tuple(sorted((k, v) for k, v in result.items() if k not in RESULT_FIELDS))
+
+    previous = {key(result): result for result in baseline}
+    regressions = 0
+    for result in results:
+        old = previous.get(key(result))
+        if old and result["fps"] < old["fps"] * (1 - tolerance):
+            regressions += 1
+            print(f"REGRESSION {dict(key(result))}: {old['fps']} -> {result['fps']} fps")
+    print(f"{regressions} regression(s) against {baseline_path} (tolerance {tolerance:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the particle flow hot paths")
+    parser.add_argument("--quick", action="store_true", help="small matrix for a fast smoke run")
+    parser.add_argument("--frames", type=int, default=FRAMES, help="timed frames per scenario")
+    parser.add_argument("--seed", type=int, default=SEED, help="random seed for every scenario")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="baseline JSON; exit with status 1 on fps regressions")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE,
+                        help="allowed fractional fps drop before a scenario counts as regressed")
+    args = parser.parse_args()
+
+    counts = QUICK_PARTICLE_COUNTS if args.quick else PARTICLE_COUNTS
+    sizes = QUICK_WINDOW_SIZES if args.quick else WINDOW_SIZES
+    details = QUICK_DETAILS if args.quick else DETAILS
+    state_counts = QUICK_STATE_PARTICLE_COUNTS if args.quick else STATE_PARTICLE_COUNTS
+
+    errors = check_display_depths(args.seed)
+    for error in errors:
+        print(f"Raster check failed: {error}")
+    if errors:
+        return 1
+
+    results = []
+    for size in sizes:
+        run_size(size, counts, details, args.frames, args.seed, results, state_counts)
+    pygame.quit()
+
+    report = {
+        "metadata": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"Results written: {args.output}")
+
+    if args.compare and compare(results, args.compare, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,30 @@
 import pygame
 import numpy as np
-from PIL import Image
-import random
-import math
+from PIL import Image, ImageSequence
 import sys
 import os
-from tkinter import filedialog
-import tkinter as tk
+import queue
+import shlex
+import subprocess
+import threading
+import csv
+import json
+import time
+import multiprocessing as mp
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+# Tk is only needed for the file dialog and monitor detection, headless render servers may lack it
+try:
+    from tkinter import filedialog
+    import tkinter as tk
+except ImportError:
+    filedialog = tk = None
+
+import patterns
+import preprocess_cache
 
 # Configuration constants
 WINDOW_WIDTH = 600
@@ -16,13 +34,24 @@ MIN_WINDOW_HEIGHT = 300
 MAX_WINDOW_WIDTH = 1920
 MAX_WINDOW_HEIGHT = 1080
 BACKGROUND_COLOR = (0, 0, 0)
+GRID_COLOR = (100, 100, 100)
 PARTICLE_COLOR = (255, 255, 255)
 PARTICLE_SIZE = 2
 DETAIL = 16
+DETAIL_LEVELS = (4, 8, 12, 16, 24, 32, 48, 64)
+USE_LUMINANCE = False
+DEFAULT_PATTERN = "spiral"  # see patterns.PATTERNS
+DEFAULT_PATTERN_PARAMS = {}
+LUMINANCE_WEIGHTS = (0.2126, 0.7152, 0.0722)  # Rec. 709
 PARTICLE_COUNT = 3000
 MAX_SPEED = 4
 TRAIL_FADE = 0.09
+TRAIL_CUTOFF = 1 / 255  # trail coverage below one 8-bit step is dropped from the trail layer
+TRAIL_SWEEP_INTERVAL = 8  # frames between dropping faded pixels from the trail layer
+MAX_TRAIL_LENGTH = 20
 FPS = 60
+SEED = None  # fixed seed for reproducible runs, None = different every run
+STATIC_STEPS = (1, 2)  # steps drawn from cached layers; the simulation pauses while they show
 
 # 3D Effect constants
 DEPTH_OFFSET = 3
@@ -30,6 +59,70 @@ RED_CHANNEL = (255, 0, 0)
 BLUE_CHANNEL = (0, 0, 255)
 ENABLE_3D = False
 
+# Flow field: brightness gradient plus curl noise, sampled bilinearly (strengths in px per update)
+ENABLE_FLOW_FIELD = True
+FLOW_GRADIENT_STRENGTH = 1.0
+FLOW_CURL_STRENGTH = 0.5  # 0 disables the curl-noise term
+FLOW_NOISE_CELL = 4  # resolution of the curl-noise potential in pixels
+FLOW_NOISE_SCALE = 256.0
+FLOW_NOISE_SEED = 0
+
+# Density step: neighbor counts from the spatial hash, colored along DENSITY_PALETTE
+DENSITY_RADIUS = 12
+DENSITY_MAX_NEIGHBORS = 12  # neighbor count that maps to the last palette color
+DENSITY_PALETTE = ((40, 90, 255), (120, 255, 120), (255, 80, 40))  # gradient stops, sparse to dense
+DENSITY_SPRITE_LEVELS = 8  # the sprites back end quantizes the gradient to this many colors
+
+# Multi-core simulation: number of worker processes (0 = advect on the main thread)
+WORKER_COUNT = 0
+
+# Frame profiler
+PROFILER_WINDOW = 240  # frames kept for rolling percentiles
+PROFILER_TRACE_FRAMES = 36000  # frames kept for trace export (10 minutes at 60 FPS)
+PROFILER_PERCENTILES = (50, 95, 99)
+
+# Adaptive quality: lower particles, trails, 3D and update rate to hold FPS on slow machines
+ADAPTIVE_QUALITY = True
+QUALITY_WINDOW = 30  # frames per decision; their median work time is compared with the budget
+QUALITY_DOWNGRADE_RATIO = 1.0  # lower quality once the median frame exceeds this share of 1/FPS
+QUALITY_UPGRADE_RATIO = 0.6  # restore quality only while frames stay under this share
+QUALITY_UPGRADE_DELAY = 3.0  # seconds after any change before restoring, doubled after each rebound
+QUALITY_MAX_UPGRADE_DELAY = 60.0
+QUALITY_PARTICLE_STEP = 0.75  # particle count factor per downgrade
+QUALITY_MIN_PARTICLES = 500
+QUALITY_MIN_TRAIL_LENGTH = 5
+QUALITY_MAX_UPDATE_FREQUENCY = 3
+
+# Playlist / slideshow
+PLAYLIST_DIRECTORY = None  # directory of images to cycle through (or pass it as the first argument)
+PLAYLIST_INTERVAL = 20.0  # seconds per image in slideshow mode, 0 = only on keypress
+PLAYLIST_PREFETCH = 2  # upcoming images prepared in the background
+PLAYLIST_CACHE_SIZE = 6  # prepared images kept in memory (LRU)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".tif", ".gif", ".webp")
+
+# Video input: decoded by ffmpeg (animated GIF/WebP/PNG by Pillow) on a background thread
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".mov", ".webm", ".avi", ".m4v")
+VIDEO_DECODER = "ffmpeg -loglevel error -i {input} -f rawvideo -pix_fmt rgb24 -s {width}x{height} -r {fps} -"
+VIDEO_PROBE = "ffprobe -v error -select_streams v:0 -show_entries stream=width,height -of csv=p=0 {input}"
+VIDEO_FPS = 30  # decoded frame rate for ffmpeg sources, animations keep their own frame timing
+VIDEO_QUEUE_SIZE = 4  # decoded frames buffered ahead of playback
+VIDEO_LOOP = True
+VIDEO_CHANGE_THRESHOLD = 0.02  # brightness change below which a grid cell is left alone
+VIDEO_FULL_UPDATE_FRACTION = 0.5  # send the whole grid instead of cells when more than this changed
+VIDEO_MAX_LAG = 0.25  # seconds playback may fall behind before it skips ahead
+
+# Rendering back ends: "raster" (NumPy accumulation buffer) or "sprites" (cached stamp atlas)
+RENDER_BACKEND = "raster"
+# Particle state: "float32" arrays, or "fixed" - int32 16.16 fixed-point positions and uint8
+# shading at roughly half the memory (no worker processes, windows up to 4095 px)
+PARTICLE_STATE = "float32"
+SPRITE_ATLAS_CAPACITY = 512
+ALPHA_QUANTUM = 8
+
+# Snapshots: complete simulation state in one compressed .npz (F5 saves, F9 restores)
+SNAPSHOT_PATH = "particle_flow_snapshot.npz"
+SNAPSHOT_VERSION = 2
+
 # Window positioning constants
 class WindowPosition:
     TOP_LEFT = "top_left"
@@ -42,36 +135,1491 @@ class WindowPosition:
     LEFT_CENTER = "left_center"
     RIGHT_CENTER = "right_center"
 
-class Particle:
-    """Particle class with trail history"""
-    __slots__ = ['x', 'y', 'prev_x', 'prev_y', 'speed', 'velocity_x', 'velocity_y', 
-                 'alpha', 'depth', 'trail_history', 'max_trail_length', 'window_width', 'window_height']
-    
-    def __init__(self, x=None, y=None, window_width=WINDOW_WIDTH, window_height=WINDOW_HEIGHT):
+def _block_sum(array, detail):
+    """Sum consecutive `detail`-sized blocks along axis 0, keeping a ragged last block"""
+    full = array.shape[0] // detail
+    blocks = array[:full * detail].reshape(full, detail, *array.shape[1:]).sum(axis=1, dtype=np.uint32)
+    if array.shape[0] % detail:
+        ragged = array[full * detail:].sum(axis=0, dtype=np.uint32)
+        blocks = np.concatenate((blocks, ragged[np.newaxis]))
+    return blocks
+
+
+def compute_brightness_grid(image_array, detail=DETAIL, luminance=False):
+    """Reduce an (height, width, 3) uint8 image to a (grid_height, grid_width) brightness grid in 0-1
+
+    Cells are summed with one reshape pass over rows and one over columns. Ragged edge cells
+    are kept and averaged over the pixels they actually cover. With `luminance` the RGB
+    channels are weighted by perceptual luminance instead of a plain mean.
+    """
+    height, width = image_array.shape[:2]
+    row_sums = _block_sum(image_array, detail)
+    cell_sums = _block_sum(row_sums.swapaxes(0, 1), detail).swapaxes(0, 1)
+
+    if luminance:
+        channel_sums = cell_sums @ np.asarray(LUMINANCE_WEIGHTS, dtype=np.float32)
+    else:
+        channel_sums = cell_sums.sum(axis=2) / np.float32(3)
+
+    # Pixels per cell - full cells have detail*detail, edge cells fewer
+    grid_height, grid_width = channel_sums.shape
+    row_counts = np.minimum(detail, height - np.arange(grid_height) * detail)
+    col_counts = np.minimum(detail, width - np.arange(grid_width) * detail)
+    counts = np.outer(row_counts, col_counts).astype(np.float32)
+    return (channel_sums / (counts * 255)).astype(np.float32)
+
+
+def fit_window_size(image_size, size=None, clamp=True):
+    """Window size for an image: scaled down to fit MAX_WINDOW_*, or an explicit (width, height)"""
+    original_width, original_height = image_size
+    aspect_ratio = original_width / original_height
+
+    if size is not None:
+        new_width, new_height = size
+    elif original_width > MAX_WINDOW_WIDTH or original_height > MAX_WINDOW_HEIGHT:
+        if aspect_ratio > 1:
+            new_width = MAX_WINDOW_WIDTH
+            new_height = int(MAX_WINDOW_WIDTH / aspect_ratio)
+        else:
+            new_height = MAX_WINDOW_HEIGHT
+            new_width = int(MAX_WINDOW_HEIGHT * aspect_ratio)
+    else:
+        new_width = max(MIN_WINDOW_WIDTH, original_width)
+        new_height = max(MIN_WINDOW_HEIGHT, original_height)
+
+    if clamp:
+        new_width = max(MIN_WINDOW_WIDTH, min(MAX_WINDOW_WIDTH, new_width))
+        new_height = max(MIN_WINDOW_HEIGHT, min(MAX_WINDOW_HEIGHT, new_height))
+    return new_width, new_height
+
+
+def read_image(image_path, size=None, clamp=True, report=None):
+    """Decode and resize an image file to a (height, width, 3) uint8 array for the window
+
+    JPEGs are decoded at a reduced DCT scale when that still covers the target size, which
+    cuts decode time several-fold on large photos. `report(stage, fraction)` gets progress.
+    """
+    report = report or (lambda stage, fraction: None)
+    report("decoding", 0.05)
+    pil_image = Image.open(image_path)
+    target = fit_window_size(pil_image.size, size, clamp)
+    pil_image.draft("RGB", target)
+    pil_image = pil_image.convert("RGB")
+
+    report("resizing", 0.5)
+    pil_image = pil_image.resize(target, Image.Resampling.LANCZOS)
+    # The one unavoidable copy: Pillow cannot share 24-bit RGB memory, so copy it once into
+    # a writable array (np.frombuffer over tobytes() would wrap an immutable bytes object)
+    return np.array(pil_image, dtype=np.uint8)
+
+
+def load_image_array(image_path, size=None, clamp=True, report=None):
+    """read_image through the on-disk preprocessing cache; returns (image_array, digest)
+
+    Only the file header is parsed to find the target size. On a hit the resized array is
+    memory-mapped from the cache and decoding is skipped entirely.
+    """
+    report = report or (lambda stage, fraction: None)
+    digest = preprocess_cache.file_digest(image_path)
+    with Image.open(image_path) as pil_image:
+        target = fit_window_size(pil_image.size, size, clamp)
+    name = preprocess_cache.image_name(digest, *target)
+    image_array = preprocess_cache.load(name)
+    if image_array is not None:
+        report("cached", 0.5)
+        return image_array, digest
+
+    image_array = read_image(image_path, target, clamp=False, report=report)
+    preprocess_cache.store(name, image_array)
+    return image_array, digest
+
+
+def cached_brightness_grid(image_array, digest, detail=DETAIL, luminance=False):
+    """compute_brightness_grid, cached on disk for images with a content `digest`"""
+    if digest is None:
+        return compute_brightness_grid(image_array, detail, luminance)
+    height, width = image_array.shape[:2]
+    name = preprocess_cache.grid_name(digest, width, height, detail, luminance)
+    brightness_grid = preprocess_cache.load(name)
+    if brightness_grid is None:
+        brightness_grid = compute_brightness_grid(image_array, detail, luminance)
+        preprocess_cache.store(name, brightness_grid)
+    return brightness_grid
+
+
+class ImageBuffer:
+    """One canonical (height, width, 3) uint8 image array, shared with pygame without copies
+
+    `surface` is built with pygame.image.frombuffer on the array's own memory, so blitting
+    it and the brightness analysis of `array` read the same bytes. pygame treats that memory
+    as writable, so a read-only array (a bytes buffer or a read-only mapping) is copied first;
+    drawing on the surface then changes `array` too. The buffer keeps the array alive for as
+    long as the surface exists.
+    """
+
+    def __init__(self, array):
+        if array.ndim == 2:
+            array = np.repeat(array[:, :, np.newaxis], 3, axis=2)
+        # No-op for the C-contiguous uint8 arrays read_image and patterns.render produce
+        self.array = np.ascontiguousarray(array[:, :, :3], dtype=np.uint8)
+        if not self.array.flags.writeable:
+            self.array = self.array.copy()
+        self.height, self.width = self.array.shape[:2]
+        self.surface = pygame.image.frombuffer(self.array, (self.width, self.height), "RGB")
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+
+class ImageLoader:
+    """Runs image loads on one background thread and hands results over at frame boundaries
+
+    start() queues a job and returns at once; the render loop polls take(), which returns the
+    finished result of the latest job in one piece (or None), so the new image, grid and
+    particles are swapped in together between two frames. Jobs report their stage and
+    progress, which the status bar shows.
+    """
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-loader")
+        self.future = None
+        self.name = ""
+        self.stage = ""
+        self.progress = 0.0
+
+    @property
+    def busy(self):
+        return self.future is not None
+
+    def start(self, name, job):
+        """Run `job(report)` in the background; a newer start() supersedes pending results"""
+        self.name = name
+        self.report("queued", 0.0)
+        self.future = self.executor.submit(job, self.report)
+
+    def report(self, stage, fraction):
+        self.stage = stage
+        self.progress = fraction
+
+    def follow(self, name, future):
+        """Hand an already queued future (e.g. from ImageCache) to take()"""
+        self.name = name
+        self.report("prefetching" if not future.done() else "ready", 0.5)
+        self.future = future
+
+    def cancel(self):
+        """Forget the pending job, its result is never handed to take()
+
+        The future itself keeps running: playlist futures are shared with ImageCache.
+        """
+        self.future = None
+
+    def take(self):
+        """The finished result of the latest job, or None while it runs (or if it failed)"""
+        if self.future is None or not self.future.done():
+            return None
+        future, self.future = self.future, None
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"Error loading image: {e}")
+            return None
+
+    def close(self):
+        self.future = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ImageCache:
+    """Bounded LRU of prepared images, filled ahead of time by a background worker
+
+    Entries are futures keyed by (path, detail, luminance): request() returns the cached or
+    in-flight future, or queues `prepare(path, detail, luminance)` for it. Finished entries
+    beyond `capacity` are evicted least recently used first; running ones are never dropped.
+    """
+
+    def __init__(self, prepare, capacity=PLAYLIST_CACHE_SIZE):
+        self.prepare = prepare
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-prefetch")
+
+    def request(self, path, detail, use_luminance):
+        key = (path, detail, use_luminance)
+        future = self.entries.get(key)
+        if future is not None and not (future.done() and future.exception()):
+            self.entries.move_to_end(key)
+            return future
+
+        future = self.executor.submit(self.prepare, path, detail, use_luminance)
+        self.entries[key] = future
+        self._evict()
+        return future
+
+    def _evict(self):
+        while len(self.entries) > self.capacity:
+            finished = next((key for key, future in self.entries.items() if future.done()), None)
+            if finished is None:
+                break
+            del self.entries[finished]
+
+    def close(self):
+        self.entries.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class Playlist:
+    """Image files of a directory in name order, with a wrapping cursor"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.paths = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.index = -1
+
+    def advance(self, step=1):
+        self.index = (self.index + step) % len(self.paths)
+        return self.paths[self.index]
+
+    def upcoming(self, count):
+        """The next `count` paths after the current one, without repeats"""
+        count = min(count, len(self.paths) - 1)
+        return [self.paths[(self.index + offset) % len(self.paths)] for offset in range(1, count + 1)]
+
+
+def is_video_file(path):
+    """True for VIDEO_EXTENSIONS files and animated images (multi-frame GIF/WebP/PNG)"""
+    if path.lower().endswith(VIDEO_EXTENSIONS):
+        return True
+    try:
+        with Image.open(path) as image:
+            return getattr(image, "is_animated", False)
+    except OSError:
+        return False
+
+
+class VideoSource:
+    """Decodes a video file on a background thread into a bounded queue of frames and grid updates
+
+    Video files are piped through ffmpeg as raw RGB at the window size, animated images are read
+    with Pillow. The thread also computes each frame's brightness grid and compares it with the
+    grid the render thread holds: only cells that moved by more than VIDEO_CHANGE_THRESHOLD are
+    sent, as (indices, values), or the whole grid when more than VIDEO_FULL_UPDATE_FRACTION
+    changed. The queue holds VIDEO_QUEUE_SIZE frames; a full queue pauses decoding, an empty one
+    just keeps the current frame on screen.
+    """
+
+    def __init__(self, path, size=None, clamp=True, detail=DETAIL, luminance=False, loop=VIDEO_LOOP):
+        self.path = path
+        self.loop = loop
+        self.use_ffmpeg = path.lower().endswith(VIDEO_EXTENSIONS)
+        self.size = fit_window_size(self._probe(), size, clamp)
+        # Read by the decoder thread for every frame; set_detail swaps in a new tuple
+        self.grid_params = (detail, luminance)
+        self.queue = queue.Queue(maxsize=VIDEO_QUEUE_SIZE)
+        self.stopped = threading.Event()
+        self.finished = False
+        self.process = None
+        self.next_time = None
+        self.thread = threading.Thread(target=self._run, name="video-decoder", daemon=True)
+        self.thread.start()
+
+    def _probe(self):
+        """Native (width, height) of the video"""
+        if not self.use_ffmpeg:
+            with Image.open(self.path) as image:
+                return image.size
+        command = VIDEO_PROBE.format(input=shlex.quote(self.path))
+        output = subprocess.run(shlex.split(command), capture_output=True, text=True, check=True).stdout
+        width, height = (int(value) for value in output.split(",")[:2])
+        return width, height
+
+    def _frames(self):
+        """(frame, duration) pairs for one pass through the file"""
+        width, height = self.size
+        if self.use_ffmpeg:
+            command = VIDEO_DECODER.format(input=shlex.quote(self.path), width=width, height=height, fps=VIDEO_FPS)
+            self.process = subprocess.Popen(shlex.split(command), stdout=subprocess.PIPE)
+            frame_bytes = width * height * 3
+            try:
+                while not self.stopped.is_set():
+                    # Read into a fresh bytearray so the frame is writable without another copy
+                    data = bytearray(frame_bytes)
+                    if self.process.stdout.readinto(data) < frame_bytes:
+                        break
+                    yield np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3), 1.0 / VIDEO_FPS
+            finally:
+                self.process.stdout.close()
+                if self.stopped.is_set():
+                    self.process.kill()
+                self.process.wait()
+        else:
+            with Image.open(self.path) as animation:
+                for frame in ImageSequence.Iterator(animation):
+                    if self.stopped.is_set():
+                        return
+                    duration = (frame.info.get("duration") or 1000 / VIDEO_FPS) / 1000
+                    frame = frame.convert("RGB").resize(self.size, Image.Resampling.LANCZOS)
+                    yield np.array(frame, dtype=np.uint8), duration
+
+    def _run(self):
+        # Brightness grid as the render thread has it after applying everything sent so far
+        reference, reference_params = None, None
+        try:
+            while not self.stopped.is_set():
+                decoded = 0
+                for frame, duration in self._frames():
+                    decoded += 1
+                    params = self.grid_params
+                    grid = compute_brightness_grid(frame, *params)
+                    indices = None
+                    if params == reference_params and grid.shape == reference.shape:
+                        indices = np.flatnonzero(np.abs(grid - reference) > VIDEO_CHANGE_THRESHOLD)
+                        if indices.size > VIDEO_FULL_UPDATE_FRACTION * grid.size:
+                            indices = None
+                    if indices is None:
+                        values = grid
+                        reference, reference_params = grid.copy(), params
+                    else:
+                        values = grid.flat[indices]
+                        reference.flat[indices] = values
+                    if not self._put((frame, duration, params, indices, values)):
+                        return
+                if not self.loop or not decoded:
+                    break
+        except (OSError, ValueError) as e:
+            print(f"Error decoding video: {e}")
+        finally:
+            self.finished = True
+
+    def _put(self, item):
+        """Queue an item, waiting while the queue is full; False once the source is closed"""
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def next_due(self, now, block=False):
+        """(frame, params, indices, values) once the next frame's time has come, else None
+
+        Never waits for the decoder unless `block` (offline rendering, where no frame may be
+        skipped). Playback more than VIDEO_MAX_LAG behind skips ahead instead of catching up.
+        """
+        if self.next_time is not None and now < self.next_time:
+            return None
+        while True:
+            try:
+                frame, duration, params, indices, values = self.queue.get(block=block, timeout=0.1)
+                break
+            except queue.Empty:
+                if not block or self.finished:
+                    return None
+        self.next_time = max(self.next_time if self.next_time is not None else now, now - VIDEO_MAX_LAG) + duration
+        return frame, params, indices, values
+
+    def close(self):
+        self.stopped.set()
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+        self.thread.join(timeout=2)
+
+
+class SpriteAtlas:
+    """LRU cache of pre-rendered circle stamps, stored in fixed slots of one SRCALPHA atlas surface
+
+    Stamps are keyed by (radius, color, quantized alpha). Memory is bounded by the atlas size;
+    when it is full the least recently used slot is redrawn with the new stamp. Slots handed out
+    since the last blits() are pinned, because a redraw would also change the sprites already
+    queued in that batch; when every slot is pinned the stamp is drawn outside the atlas.
+    """
+
+    def __init__(self, capacity=SPRITE_ATLAS_CAPACITY, max_radius=PARTICLE_SIZE, alpha_quantum=ALPHA_QUANTUM):
+        self.capacity = capacity
+        self.max_radius = max_radius
+        self.alpha_quantum = alpha_quantum
+        self.slot_size = max_radius * 2
+        self.atlas = None
+        self.slots = OrderedDict()  # key -> (slot index, stamp subsurface), oldest first
+        self.pinned = set()  # keys queued in the batch being built, not evictable until it is blitted
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def quantize_alpha(self, alpha):
+        """Round an alpha byte (0-255) to the atlas alpha step"""
+        quantum = self.alpha_quantum
+        return max(0, min(255, (int(alpha) + quantum // 2) // quantum * quantum))
+
+    def get(self, radius, color, alpha):
+        """Stamp surface for a circle of `radius` in `color` with alpha byte `alpha`"""
+        key = (radius, color, self.quantize_alpha(alpha))
+        entry = self.slots.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.slots.move_to_end(key)
+            self.pinned.add(key)
+            return entry[1]
+
+        self.misses += 1
+        if radius > self.max_radius:
+            raise ValueError(f"Stamp radius {radius} exceeds atlas max_radius {self.max_radius}")
+        if self.atlas is None:
+            self.atlas = pygame.Surface((self.slot_size * self.capacity, self.slot_size), pygame.SRCALPHA)
+
+        if len(self.slots) < self.capacity:
+            slot = len(self.slots)
+        else:
+            # Pinned keys were moved to the end on use, so the oldest unpinned one is found early
+            victim = next((k for k in self.slots if k not in self.pinned), None)
+            if victim is None:
+                stamp = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+                pygame.draw.circle(stamp, (*color, key[2]), (radius, radius), radius)
+                return stamp
+            slot, _ = self.slots.pop(victim)
+            self.evictions += 1
+
+        slot_rect = pygame.Rect(slot * self.slot_size, 0, self.slot_size, self.slot_size)
+        self.atlas.fill((0, 0, 0, 0), slot_rect)
+        stamp = self.atlas.subsurface((slot_rect.x, 0, radius * 2, radius * 2))
+        pygame.draw.circle(stamp, (*color, key[2]), (radius, radius), radius)
+        self.slots[key] = (slot, stamp)
+        self.pinned.add(key)
+        return stamp
+
+    def blits(self, target, sequence):
+        """Blit a batch of (stamp, position) pairs built with get(), then unpin its slots"""
+        target.blits(sequence, doreturn=False)
+        self.pinned.clear()
+
+    def blit_particles(self, target, system, enable_3d=False, alpha_scale=255, anaglyph_alpha_scale=180):
+        """Draw every particle of a ParticleSystem with one Surface.blits call"""
+        radius = PARTICLE_SIZE
+        top = (system.y - radius).astype(np.int32).tolist()
+        if enable_3d:
+            alpha = np.clip(system.alpha * anaglyph_alpha_scale, 0, 255).astype(np.int32).tolist()
+            offset = (DEPTH_OFFSET * system.depth).astype(np.int32)
+            red_left = (system.x - radius - offset).astype(np.int32).tolist()
+            blue_left = (system.x - radius + offset).astype(np.int32).tolist()
+            sequence = []
+            for a, rx, bx, ty in zip(alpha, red_left, blue_left, top):
+                if a > 0:
+                    sequence.append((self.get(radius, RED_CHANNEL, a), (rx, ty)))
+                    sequence.append((self.get(radius, BLUE_CHANNEL, a), (bx, ty)))
+        else:
+            alpha = np.clip(system.alpha * alpha_scale, 0, 255).astype(np.int32).tolist()
+            left = (system.x - radius).astype(np.int32).tolist()
+            sequence = [(self.get(radius, PARTICLE_COLOR, a), (lx, ty))
+                        for a, lx, ty in zip(alpha, left, top) if a > 0]
+        self.blits(target, sequence)
+
+    def blit_colored(self, target, x, y, alpha, palette, color_index, alpha_scale=255):
+        """Draw particles with one Surface.blits call, coloring each through `palette`"""
+        radius = PARTICLE_SIZE
+        alpha = np.clip(alpha * alpha_scale, 0, 255).astype(np.int32).tolist()
+        left = (x - radius).astype(np.int32).tolist()
+        top = (y - radius).astype(np.int32).tolist()
+        sequence = [(self.get(radius, palette[c], a), (lx, ty))
+                    for a, c, lx, ty in zip(alpha, color_index.tolist(), left, top) if a > 0]
+        self.blits(target, sequence)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            "stamps": len(self.slots),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+        }
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+# Shared stamp cache for all particle draw paths
+SPRITE_ATLAS = SpriteAtlas()
+
+
+class TrailStore:
+    """Per-particle trail history in one preallocated (particles x max_length x 4) ring buffer
+
+    Each entry is (x, y, alpha, depth). Every particle has its own head (next write slot) and
+    length, so memory stays fixed and resets are plain masked writes. Entries are stored as
+    DTYPE and divided by SCALE when read back (see CompactTrailStore).
+    """
+
+    DTYPE = np.float32
+    SCALE = None
+
+    def __init__(self, count, max_length=MAX_TRAIL_LENGTH):
+        self.count = count
+        self.max_length = max_length
+        self.data = np.zeros((count, max_length, 4), dtype=self.DTYPE)
+        self.head = np.zeros(count, dtype=np.int32)
+        self.length = np.zeros(count, dtype=np.int32)
+        self._rows = np.arange(count)
+        # True while every particle shares the same head, so pushes are one strided slice write
+        self._heads_aligned = True
+
+    def push(self, x, y, alpha, depth):
+        """Append the current state of every particle"""
+        if self.max_length == 0:
+            return
+        if self._heads_aligned:
+            head = int(self.head[0]) if self.count else 0
+            for channel, values in enumerate((x, y, alpha, depth)):
+                self.data[:, head, channel] = values
+        else:
+            self.data[self._rows, self.head] = np.stack((x, y, alpha, depth), axis=1)
+        self._advance()
+
+    def push_entries(self, entries):
+        """Append a (count, 4) array of entries already in DTYPE units, one whole entry per particle"""
+        if self.max_length == 0:
+            return
+        if self._heads_aligned:
+            self.data[:, int(self.head[0]) if self.count else 0] = entries
+        else:
+            self.data[self._rows, self.head] = entries
+        self._advance()
+
+    def _advance(self):
+        if self._heads_aligned:
+            head = int(self.head[0]) if self.count else 0
+            self.head.fill((head + 1) % self.max_length)
+        else:
+            self.head += 1
+            self.head[self.head == self.max_length] = 0
+        self.length += 1
+        np.minimum(self.length, self.max_length, out=self.length)
+
+    def push_one(self, index, x, y, alpha, depth):
+        if self.max_length == 0:
+            return
+        self._heads_aligned = self.count == 1
+        self.data[index, self.head[index]] = (x, y, alpha, depth)
+        self.head[index] = (self.head[index] + 1) % self.max_length
+        self.length[index] = min(self.length[index] + 1, self.max_length)
+
+    def reset(self, mask):
+        """Forget the history of every particle selected by `mask` (boolean array or indices)"""
+        self.length[mask] = 0
+
+    def resize(self, count=None, max_length=None):
+        """Change the particle count and/or trail length, keeping the newest history that fits
+
+        Kept entries are right-aligned so every head is back at slot 0 and pushes stay aligned.
+        """
+        count = self.count if count is None else count
+        max_length = self.max_length if max_length is None else max_length
+        keep = min(count, self.count)
+        data = np.zeros((count, max_length, 4), dtype=self.DTYPE)
+        length = np.zeros(count, dtype=np.int32)
+        if keep and max_length and self.max_length:
+            points = self._ordered_entries(keep)
+            # Slot s of the new ring takes entry (length - max_length + s) of the oldest-first history
+            source = self.length[:keep, None] - max_length + np.arange(max_length)
+            gathered = np.take_along_axis(points, np.clip(source, 0, self.max_length - 1)[:, :, None], axis=1)
+            data[:keep] = np.where((source >= 0)[:, :, None], gathered, 0)
+            length[:keep] = np.minimum(self.length[:keep], max_length)
+
+        self.count = count
+        self.max_length = max_length
+        self.data = data
+        self.head = np.zeros(count, dtype=np.int32)
+        self.length = length
+        self._rows = np.arange(count)
+        self._heads_aligned = True
+
+    def restore(self, data, head, length):
+        """Take over ring contents saved from another store (see ParticleSystem.snapshot)"""
+        self.count, self.max_length = data.shape[:2]
+        self.data = np.array(data, dtype=self.DTYPE)
+        self.head = np.array(head, dtype=np.int32)
+        self.length = np.array(length, dtype=np.int32)
+        self._rows = np.arange(self.count)
+        self._heads_aligned = self.count == 0 or bool(np.all(self.head == self.head[0]))
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.head.nbytes + self.length.nbytes
+
+    def _decode(self, entries):
+        return entries if self.SCALE is None else entries * (1 / self.SCALE)
+
+    def history(self, index):
+        """Trail of one particle, oldest entry first, as two contiguous slices of the ring"""
+        head, length = self.head[index], self.length[index]
+        start = head - length
+        if start >= 0:
+            return self._decode(self.data[index, start:head])
+        return self._decode(np.concatenate((self.data[index, start:], self.data[index, :head])))
+
+    def _ordered_entries(self, count):
+        """Stored entries of the first `count` particles, oldest first along axis 1"""
+        steps = np.arange(self.max_length)
+        slots = (self.head[:count, None] - self.length[:count, None] + steps) % max(1, self.max_length)
+        return np.take_along_axis(self.data[:count], slots[:, :, None], axis=1)
+
+    def ordered(self, count=None):
+        """(points, valid) for the first `count` particles, oldest entry first along axis 1"""
+        count = self.count if count is None else min(count, self.count)
+        valid = np.arange(self.max_length) < self.length[:count, None]
+        return self._decode(self._ordered_entries(count)), valid
+
+
+class CompactTrailStore(TrailStore):
+    """TrailStore with 8-byte entries: x, y as 12.4 fixed-point uint16, alpha and depth as 0-255
+
+    Pushed values must already be in those units (CompactParticleSystem pushes whole entries
+    with x >> 12); history() and ordered() return float32 pixels and 0-1 shading like TrailStore.
+    """
+
+    DTYPE = np.uint16
+    SCALE = np.float32([16, 16, 255, 255])
+
+
+class SpatialHash:
+    """Uniform-grid spatial hash over particle positions, rebuilt every frame
+
+    build() counting-sorts the particles by cell: np.bincount gives the per-cell counts and
+    their running sum the start of each cell's run in `order`. Neighbor queries only visit the
+    cells a radius overlaps, so interactions stay O(n) for a bounded density instead of O(n^2).
+    """
+
+    def __init__(self, cell_size, width, height):
+        self.resize(cell_size, width, height)
+
+    def resize(self, cell_size, width, height):
+        self.cell_size = max(1, int(cell_size))
+        self.columns = max(1, -(-int(width) // self.cell_size))
+        self.rows = max(1, -(-int(height) // self.cell_size))
+        cells = self.columns * self.rows
+        self.counts = np.zeros(cells, dtype=np.intp)
+        self.start = np.zeros(cells + 1, dtype=np.intp)
+        # Cell keys fit 16 bits on typical windows, where NumPy's stable sort is a radix sort
+        self._key_type = np.uint16 if cells <= 1 << 16 else np.intp
+        self.order = np.zeros(0, dtype=np.intp)
+        self.x = self.y = np.zeros(0, dtype=np.float32)
+        self._sorted = (self.x, self.y, self.order, self.order)
+
+    def cell_coordinates(self, x, y):
+        """Column and row of every position, clamped to the grid"""
+        column = np.clip((x / self.cell_size).astype(np.intp), 0, self.columns - 1)
+        row = np.clip((y / self.cell_size).astype(np.intp), 0, self.rows - 1)
+        return column, row
+
+    def build(self, x, y):
+        """Bucket the positions (x, y) - kept by reference, indices refer to these arrays"""
+        self.x, self.y = x, y
+        column, row = self.cell_coordinates(x, y)
+        cell = row * self.columns + column
+        self.counts[:] = np.bincount(cell, minlength=len(self.counts))
+        np.cumsum(self.counts, out=self.start[1:])
+        self.order = np.argsort(cell.astype(self._key_type), kind="stable")
+        # Positions and cells in bucket order, so a cell's particles are one contiguous run
+        self._sorted = (x[self.order], y[self.order], column[self.order], row[self.order])
+
+    def cell_members(self, column, row):
+        """Indices of the particles in one cell"""
+        cell = row * self.columns + column
+        return self.order[self.start[cell]:self.start[cell + 1]]
+
+    def neighbors(self, x, y, radius):
+        """Indices of the particles within `radius` of the point (x, y)"""
+        (low_column, high_column), (low_row, high_row) = self.cell_coordinates(
+            np.array([x - radius, x + radius]), np.array([y - radius, y + radius]))
+        runs = [self.order[self.start[row * self.columns + low_column]:
+                           self.start[row * self.columns + high_column + 1]]
+                for row in range(low_row, high_row + 1)]
+        candidates = np.concatenate(runs) if runs else self.order[:0]
+        dx, dy = self.x[candidates] - x, self.y[candidates] - y
+        return candidates[dx * dx + dy * dy <= radius * radius]
+
+    def _batches(self, radius):
+        """(i, j) positions in bucket order of all pairs within `radius`, self-pairs included
+
+        Cells are numbered row by row, so the cells a particle needs in one neighboring row
+        are a single run of `order`. Each batch pairs every particle with that run.
+        """
+        x, y, column, row = self._sorted
+        reach = max(1, -(-int(np.ceil(radius)) // self.cell_size))
+        limit = np.float32(radius * radius)
+        low_column = np.maximum(column - reach, 0)
+        high_column = np.minimum(column + reach, self.columns - 1) + 1
+        for offset in range(-reach, reach + 1):
+            neighbor_row = row + offset
+            first = np.flatnonzero((neighbor_row >= 0) & (neighbor_row < self.rows))
+            base = neighbor_row[first] * self.columns
+            begin = self.start[base + low_column[first]]
+            sizes = self.start[base + high_column[first]] - begin
+            ends = np.cumsum(sizes)
+            total = int(ends[-1]) if len(ends) else 0
+            if total == 0:
+                continue
+
+            # Expand every particle against its run: j walks the run, i repeats alongside
+            j = np.repeat(begin - (ends - sizes), sizes)
+            j += np.arange(total)
+            i = np.repeat(first, sizes)
+            dx, dy = x[j] - x[i], y[j] - y[i]
+            keep = dx * dx + dy * dy <= limit
+            yield i[keep], j[keep]
+
+    def pairs(self, radius):
+        """Yield (i, j) index arrays of every ordered pair of particles within `radius`
+
+        Each neighbor relation appears once from either side. One batch is yielded per
+        neighboring cell row, so memory stays at about n x (particles per cell).
+        """
+        for i, j in self._batches(radius):
+            distinct = i != j
+            yield self.order[i[distinct]], self.order[j[distinct]]
+
+    def neighbor_counts(self, radius):
+        """Number of other particles within `radius` of each particle"""
+        counts = np.full(len(self.x), -1, dtype=np.intp)  # every particle meets itself once
+        for i, _ in self._batches(radius):
+            counts += np.bincount(i, minlength=len(counts))
+        result = np.empty_like(counts)
+        result[self.order] = counts
+        return result
+
+
+def sample_grid(brightness_grid, x, y, detail):
+    """Nearest-cell brightness lookup for arrays of positions"""
+    if brightness_grid is None or brightness_grid.size == 0:
+        return np.full(len(x), 0.5, dtype=np.float32)
+
+    grid_height, grid_width = brightness_grid.shape
+    grid_x = np.clip((x / detail).astype(np.int32), 0, grid_width - 1)
+    grid_y = np.clip((y / detail).astype(np.int32), 0, grid_height - 1)
+    return brightness_grid[grid_y, grid_x]
+
+
+def sample_flow(flow, x, y, detail):
+    """Bilinear lookup of a FlowField.vectors array, returns (velocity_x, velocity_y) arrays
+
+    Vectors sit at cell centers and the field carries one padding cell on the right and
+    bottom edge, so the four corner reads never need bounds checks. Positions beyond the
+    outer centers clamp to the edge.
+    """
+    _, padded_height, padded_width = flow.shape
+    grid_x = x * np.float32(1 / detail)
+    grid_x -= np.float32(0.5)
+    np.clip(grid_x, 0, padded_width - 2, out=grid_x)
+    grid_y = y * np.float32(1 / detail)
+    grid_y -= np.float32(0.5)
+    np.clip(grid_y, 0, padded_height - 2, out=grid_y)
+
+    # Split into cell index and fractional offset, the offsets become the blend weights
+    cell_x = np.floor(grid_x)
+    cell_y = np.floor(grid_y)
+    grid_x -= cell_x
+    grid_y -= cell_y
+    top = cell_y.astype(np.intp)
+    top *= padded_width
+    top += cell_x.astype(np.intp)
+    bottom = top + padded_width
+
+    velocities = []
+    for plane in flow.reshape(2, -1):
+        top_left, top_right = plane.take(top), plane.take(top + 1)
+        bottom_left, bottom_right = plane.take(bottom), plane.take(bottom + 1)
+        top_right -= top_left
+        top_right *= grid_x
+        top_left += top_right
+        bottom_right -= bottom_left
+        bottom_right *= grid_x
+        bottom_left += bottom_right
+        bottom_left -= top_left
+        bottom_left *= grid_y
+        top_left += bottom_left
+        velocities.append(top_left)
+    return velocities
+
+
+def _scaled_to(vectors, strength):
+    """Scale a (2, h, w) vector field in place so its longest vector has length `strength`"""
+    longest = np.sqrt((vectors * vectors).sum(axis=0)).max() if vectors.size else 0
+    if longest > 1e-6:
+        vectors *= strength / longest
+    else:
+        vectors[:] = 0
+    return vectors
+
+
+class FlowField:
+    """Per-cell velocity field from the brightness gradient plus an optional curl-noise term
+
+    build() runs once per image load or DETAIL change. The curl-noise potential is generated
+    once per window size at FLOW_NOISE_CELL resolution, so a new DETAIL only resamples it and
+    takes the gradient of the (small) new brightness grid.
+    """
+
+    def __init__(self, gradient_strength=FLOW_GRADIENT_STRENGTH, curl_strength=FLOW_CURL_STRENGTH,
+                 seed=FLOW_NOISE_SEED):
+        self.gradient_strength = gradient_strength
+        self.curl_strength = curl_strength
+        self.seed = seed
+        # (2, grid_h + 1, grid_w + 1) float32 x/y velocity per cell, edge-padded; None until built
+        self.vectors = None
+        self.detail = None
+        # (window size, potential) - one tuple so background loads can share it safely
+        self._potential = (None, None)
+
+    @staticmethod
+    def shape_for(grid_shape):
+        """Shape of the vectors array for a brightness grid of `grid_shape`"""
+        return 2, grid_shape[0] + 1, grid_shape[1] + 1
+
+    def _noise_potential(self, width, height):
+        size, potential = self._potential
+        if size != (width, height):
+            potential = patterns.noise(-(-width // FLOW_NOISE_CELL), -(-height // FLOW_NOISE_CELL),
+                                       scale=FLOW_NOISE_SCALE / FLOW_NOISE_CELL, seed=self.seed)
+            self._potential = ((width, height), potential)
+        return potential
+
+    def _curl(self, grid_shape, detail, width, height):
+        """Curl of the noise potential sampled at the cell centers of a `detail` grid"""
+        potential = self._noise_potential(width, height)
+        rows = ((np.arange(grid_shape[0]) + 0.5) * detail / FLOW_NOISE_CELL).astype(np.int32)
+        cols = ((np.arange(grid_shape[1]) + 0.5) * detail / FLOW_NOISE_CELL).astype(np.int32)
+        cells = potential[np.minimum(rows, potential.shape[0] - 1)[:, np.newaxis],
+                          np.minimum(cols, potential.shape[1] - 1)]
+        d_dy, d_dx = np.gradient(cells)
+        return np.stack((d_dy, -d_dx)).astype(np.float32)
+
+    def build(self, brightness_grid, detail, width, height):
+        """Rebuild the vectors for a new brightness grid, returns them"""
+        self.vectors = self.compute(brightness_grid, detail, width, height)
+        self.detail = detail
+        return self.vectors
+
+    def compute(self, brightness_grid, detail, width, height):
+        """Vectors for a brightness grid without installing them (safe off the render thread)"""
+        shape = brightness_grid.shape
+        vectors = np.zeros((2, *shape), dtype=np.float32)
+        if min(shape) >= 2:
+            # Drift up the brightness gradient so particles gather where the image is bright
+            d_dy, d_dx = np.gradient(brightness_grid.astype(np.float32))
+            vectors[0], vectors[1] = d_dx, d_dy
+            _scaled_to(vectors, self.gradient_strength)
+            if self.curl_strength:
+                vectors += _scaled_to(self._curl(shape, detail, width, height), self.curl_strength)
+        return np.pad(vectors, ((0, 0), (0, 1), (0, 1)), mode="edge")
+
+
+def advect_particles(state, wrapped, brightness_grid, detail, width, height, rng, flow=None):
+    """Advance a block of particle state in place
+
+    `state` is a (len(STATE_FIELDS), n) float32 array (or a column slice of one), `wrapped`
+    the matching boolean array that receives the wraparound mask. `flow` is an optional
+    FlowField.vectors array added to the motion. Shared by ParticleSystem and the worker
+    processes of ParticleWorkerPool.
+    """
+    x, y, prev_x, prev_y, speed, velocity_x, velocity_y, alpha, depth = state
+    brightness = sample_grid(brightness_grid, x, y, detail)
+
+    # Calculate speed based on brightness
+    np.multiply(brightness, MAX_SPEED, out=speed)
+
+    # Update position
+    prev_x[:] = x
+    prev_y[:] = y
+    if flow is not None and flow.size:
+        flow_x, flow_y = sample_flow(flow, x, y, detail)
+        x += flow_x
+        y += flow_y
+    x += (1 - brightness) * 2.5 + velocity_x
+    y += velocity_y * 0.3
+
+    # Wrap around screen
+    right = x > width
+    left = x < 0
+    x[right] = 0
+    x[left] = width
+    respawned = np.count_nonzero(right)
+    if respawned:
+        y[right] = rng.uniform(0, height, respawned)
+
+    bottom = y > height
+    top = y < 0
+    y[bottom] = 0
+    y[top] = height
+
+    np.logical_or.reduce((right, left, bottom, top), out=wrapped)
+
+    # Update alpha and depth
+    np.minimum(brightness * 0.9 + 0.1, 1.0, out=alpha)
+    depth[:] = brightness
+
+
+class ParticleSystem:
+    """Structure-of-arrays particle engine - every particle advances in one batched pass"""
+
+    # Rows of the state array, each exposed as an attribute
+    STATE_FIELDS = ('x', 'y', 'prev_x', 'prev_y', 'speed', 'velocity_x', 'velocity_y', 'alpha', 'depth')
+
+    def __init__(self, count, window_width=WINDOW_WIDTH, window_height=WINDOW_HEIGHT, x=None, y=None, seed=None,
+                 trail_length=MAX_TRAIL_LENGTH):
+        self.count = count
         self.window_width = window_width
         self.window_height = window_height
-        self.x = x if x is not None else random.uniform(0, self.window_width)
-        self.y = y if y is not None else random.uniform(0, self.window_height)
-        self.prev_x = self.x
-        self.prev_y = self.y
-        self.speed = 0
-        self.velocity_x = random.uniform(-0.5, 0.5)
-        self.velocity_y = random.uniform(-0.5, 0.5)
-        self.alpha = random.uniform(0.3, 1.0)
-        self.depth = random.uniform(0.0, 1.0)
-        self.trail_history = []
-        self.max_trail_length = 20
-
-    def update(self, brightness_grid, grid_width, grid_height):
+        self.rng = np.random.default_rng(seed)
+
+        # Particle state, one float32 row per attribute
+        state = np.zeros((len(self.STATE_FIELDS), count), dtype=np.float32)
+        self.bind_state(state, np.zeros(count, dtype=bool))
+        self.x[:] = self._initial(x, 0, window_width)
+        self.y[:] = self._initial(y, 0, window_height)
+        self.prev_x[:] = self.x
+        self.prev_y[:] = self.y
+        self.velocity_x[:] = self._initial(None, -0.5, 0.5)
+        self.velocity_y[:] = self._initial(None, -0.5, 0.5)
+        self.alpha[:] = self._initial(None, 0.3, 1.0)
+        self.depth[:] = self._initial(None, 0.0, 1.0)
+
+        self.trails = TrailStore(count, trail_length)
+
+        # Brightness grid cell size in pixels
+        self.detail = DETAIL
+
+    def bind_state(self, state, wrapped):
+        """Point the attribute arrays at `state` rows (used to swap in shared-memory buffers)"""
+        self.state = state
+        for row, name in enumerate(self.STATE_FIELDS):
+            setattr(self, name, state[row])
+        # Particles that wrapped around the screen edge on the last update
+        self.wrapped = wrapped
+
+    def _initial(self, values, low, high):
+        if values is not None:
+            return np.array(values, dtype=np.float32).reshape(self.count)
+        return self.rng.uniform(low, high, self.count).astype(np.float32)
+
+    def resize(self, count):
+        """Change the particle count in place: the first particles keep flowing, new ones spawn at random"""
+        keep = min(count, self.count)
+        state = np.zeros((len(self.STATE_FIELDS), count), dtype=np.float32)
+        state[:, :keep] = self.state[:, :keep]
+        spawned = count - keep
+        if spawned:
+            rows = dict(zip(self.STATE_FIELDS, state[:, keep:]))
+            rows['x'][:] = self.rng.uniform(0, self.window_width, spawned)
+            rows['y'][:] = self.rng.uniform(0, self.window_height, spawned)
+            rows['prev_x'][:] = rows['x']
+            rows['prev_y'][:] = rows['y']
+            rows['velocity_x'][:] = self.rng.uniform(-0.5, 0.5, spawned)
+            rows['velocity_y'][:] = self.rng.uniform(-0.5, 0.5, spawned)
+            rows['alpha'][:] = self.rng.uniform(0.3, 1.0, spawned)
+            rows['depth'][:] = self.rng.uniform(0.0, 1.0, spawned)
+        self.count = count
+        self.bind_state(state, np.zeros(count, dtype=bool))
+        self.trails.resize(count=count)
+
+    def snapshot(self):
+        """Particle state, trails and the RNG position as a dict of arrays (see restore)"""
+        return {
+            "state": self.state,
+            "wrapped": self.wrapped,
+            "trail_data": self.trails.data,
+            "trail_head": self.trails.head,
+            "trail_length": self.trails.length,
+            "system": np.array([self.window_width, self.window_height, self.detail]),
+            "rng_state": np.array(json.dumps(self.rng.bit_generator.state)),
+        }
+
+    @classmethod
+    def restore(cls, arrays):
+        """Rebuild a system from snapshot() arrays; it continues exactly where the original was"""
+        width, height, detail = (int(value) for value in arrays["system"])
+        system = cls(0, width, height)
+        system.count = arrays["state"].shape[1]
+        system.bind_state(np.array(arrays["state"], dtype=np.float32), np.array(arrays["wrapped"], dtype=bool))
+        system.trails.restore(arrays["trail_data"], arrays["trail_head"], arrays["trail_length"])
+        system.rng.bit_generator.state = json.loads(str(arrays["rng_state"]))
+        system.detail = detail
+        return system
+
+    def sample_brightness(self, brightness_grid):
+        """Nearest-cell brightness lookup for every particle"""
+        return sample_grid(brightness_grid, self.x, self.y, self.detail)
+
+    def update(self, brightness_grid, flow=None):
+        # Store previous position for trail with alpha info
+        self.trails.push(self.x, self.y, self.alpha, self.depth)
+        advect_particles(self.state, self.wrapped, brightness_grid, self.detail,
+                         self.window_width, self.window_height, self.rng, flow)
+        self.trails.reset(self.wrapped)
+
+    @property
+    def nbytes(self):
+        """Resident bytes of the particle state and trail history"""
+        return self.state.nbytes + self.wrapped.nbytes + self.trails.nbytes
+
+    def view(self, index):
+        return Particle(system=self, index=index)
+
+    def views(self, count=None):
+        """Particle views for the first `count` particles (all by default)"""
+        count = self.count if count is None else min(count, self.count)
+        return [Particle(system=self, index=i) for i in range(count)]
+
+
+def _decoded_field(row, scale):
+    """Read-only float32 attribute decoded from a fixed-point row, cached until the next update"""
+    def getter(self):
+        if row not in self._decoded:
+            decoded = self._rows[row] * np.float32(1 / scale)
+            decoded.flags.writeable = False  # writes would only change this copy
+            self._decoded[row] = decoded
+        return self._decoded[row]
+
+    return property(getter)
+
+
+class CompactParticleSystem:
+    """ParticleSystem variant holding its state in fixed point
+
+    Positions and velocities are int32 16.16 fixed-point, alpha and depth uint8, and trails
+    12.4 fixed-point uint16 (CompactTrailStore): about half the resident bytes per particle of
+    the float32 system, and the update pass stays in integer arithmetic apart from flow
+    sampling. Updates work in place through one preallocated int32 scratch pair instead of
+    per-step temporaries. The renderers read the usual float32 x / y / alpha / depth, which are
+    decoded on first access after each update. Stepping runs on the main thread only.
+    """
+
+    FRACTION_BITS = 16
+    ONE = 1 << FRACTION_BITS
+    MAX_EXTENT = 4096  # trail positions keep 12 integer bits
+
+    # Rows of `positions`, then of `shading`
+    POSITION_FIELDS = ('x', 'y', 'prev_x', 'prev_y', 'velocity_x', 'velocity_y')
+    SHADING_FIELDS = ('alpha', 'depth')
+
+    x = _decoded_field(0, ONE)
+    y = _decoded_field(1, ONE)
+    prev_x = _decoded_field(2, ONE)
+    prev_y = _decoded_field(3, ONE)
+    velocity_x = _decoded_field(4, ONE)
+    velocity_y = _decoded_field(5, ONE)
+    alpha = _decoded_field(6, 255)
+    depth = _decoded_field(7, 255)
+
+    @property
+    def speed(self):
+        """Not stored: speed is brightness * MAX_SPEED, and depth holds the brightness"""
+        return self.depth * np.float32(MAX_SPEED)
+
+    def __init__(self, count, window_width=WINDOW_WIDTH, window_height=WINDOW_HEIGHT, x=None, y=None, seed=None,
+                 trail_length=MAX_TRAIL_LENGTH):
+        if max(window_width, window_height) >= self.MAX_EXTENT:
+            raise ValueError(f"fixed-point particle state supports windows up to {self.MAX_EXTENT - 1} px")
+        self.count = count
+        self.window_width = window_width
+        self.window_height = window_height
+        self.rng = np.random.default_rng(seed)
+        self.positions = np.zeros((len(self.POSITION_FIELDS), count), dtype=np.int32)
+        self.shading = np.zeros((len(self.SHADING_FIELDS), count), dtype=np.uint8)
+        self.wrapped = np.zeros(count, dtype=bool)
+        self._bind_rows()
+        self._spawn(0, x, y)
+        self.trails = CompactTrailStore(count, trail_length)
+        self.detail = DETAIL
+
+    def _bind_rows(self):
+        self._rows = list(self.positions) + list(self.shading)
+        self._decoded = {}
+        self._scratch = np.empty((2, self.count), dtype=np.int32)
+        # The trail entries being pushed share the scratch memory, they are written before it is used
+        self._entries = self._scratch.reshape(-1).view(np.uint16).reshape(self.count, 4)
+
+    def _to_fixed(self, values):
+        return (np.asarray(values, dtype=np.float64) * self.ONE).astype(np.int32)
+
+    def _spawn(self, start, x=None, y=None):
+        """Initialize particles [start:] - same draws, in the same order, as ParticleSystem"""
+        count = self.count - start
+
+        def initial(values, low, high):
+            if values is not None:
+                return np.array(values, dtype=np.float32).reshape(count)
+            return self.rng.uniform(low, high, count).astype(np.float32)
+
+        rows = self.positions[:, start:]
+        rows[0] = self._to_fixed(initial(x, 0, self.window_width))
+        rows[1] = self._to_fixed(initial(y, 0, self.window_height))
+        rows[2] = rows[0]
+        rows[3] = rows[1]
+        rows[4] = self._to_fixed(initial(None, -0.5, 0.5))
+        rows[5] = self._to_fixed(initial(None, -0.5, 0.5))
+        self.shading[0, start:] = np.rint(initial(None, 0.3, 1.0) * 255)
+        self.shading[1, start:] = np.rint(initial(None, 0.0, 1.0) * 255)
+
+    def _fixed_grid(self, brightness_grid):
+        """The brightness grid in 0-ONE fixed point
+
+        Converted on every update: the grid is only window / DETAIL cells, and video playback
+        patches it in place, so caching by identity would steer by a stale frame.
+        """
+        return np.rint(np.asarray(brightness_grid) * self.ONE).astype(np.int32)
+
+    def update(self, brightness_grid, flow=None):
+        x, y, prev_x, prev_y, velocity_x, velocity_y = self.positions
+        alpha, depth = self.shading
+        self._decoded = {}
+        # Previous state into the trails, positions reduced to 12.4 fixed point
+        entries = self._entries
+        np.right_shift(x, self.FRACTION_BITS - 4, out=entries[:, 0], casting="unsafe")
+        np.right_shift(y, self.FRACTION_BITS - 4, out=entries[:, 1], casting="unsafe")
+        entries[:, 2] = alpha
+        entries[:, 3] = depth
+        self.trails.push_entries(entries)
+
+        first, second = self._scratch
+        if brightness_grid is None or len(brightness_grid) == 0:
+            brightness = first
+            brightness.fill(self.ONE // 2)
+        else:
+            grid = self._fixed_grid(brightness_grid)
+            grid_height, grid_width = grid.shape
+            cell = self.detail << self.FRACTION_BITS
+            np.floor_divide(y, cell, out=first)
+            np.clip(first, 0, grid_height - 1, out=first)
+            first *= grid_width
+            np.floor_divide(x, cell, out=second)
+            np.clip(second, 0, grid_width - 1, out=second)
+            first += second
+            brightness = grid.reshape(-1).take(first, out=first)
+
+        prev_x[:] = x
+        prev_y[:] = y
+        if flow is not None and flow.size:
+            scale = np.float32(1 / self.ONE)
+            flow_x, flow_y = sample_flow(flow, x * scale, y * scale, self.detail)
+            for position, velocity in ((x, flow_x), (y, flow_y)):
+                velocity *= self.ONE
+                np.copyto(second, velocity, casting="unsafe")
+                position += second
+        # x += (1 - brightness) * 2.5 + velocity_x, y += velocity_y * 0.3
+        np.subtract(self.ONE, brightness, out=second)
+        second *= 5
+        second >>= 1
+        second += velocity_x
+        x += second
+        np.multiply(velocity_y, 19661, out=second)
+        second >>= 16
+        y += second
+
+        # Wrap around screen
+        width, height = self.window_width << self.FRACTION_BITS, self.window_height << self.FRACTION_BITS
+        right = x > width
+        left = x < 0
+        x[right] = 0
+        x[left] = width
+        respawned = np.count_nonzero(right)
+        if respawned:
+            y[right] = self._to_fixed(self.rng.uniform(0, self.window_height, respawned))
+
+        bottom = y > height
+        top = y < 0
+        y[bottom] = 0
+        y[top] = height
+        np.logical_or.reduce((right, left, bottom, top), out=self.wrapped)
+
+        # alpha = min(brightness * 0.9 + 0.1, 1), depth = brightness, both scaled to 0-255
+        np.multiply(brightness, 230, out=second)
+        second >>= self.FRACTION_BITS
+        second += 26
+        np.minimum(second, 255, out=second)
+        alpha[:] = second
+        np.multiply(brightness, 255, out=second)
+        second >>= self.FRACTION_BITS
+        np.minimum(second, 255, out=second)
+        depth[:] = second
+        self.trails.reset(self.wrapped)
+
+    def resize(self, count):
+        """Change the particle count in place: the first particles keep flowing, new ones spawn at random"""
+        keep = min(count, self.count)
+        positions = np.zeros((len(self.POSITION_FIELDS), count), dtype=np.int32)
+        shading = np.zeros((len(self.SHADING_FIELDS), count), dtype=np.uint8)
+        positions[:, :keep] = self.positions[:, :keep]
+        shading[:, :keep] = self.shading[:, :keep]
+        self.count = count
+        self.positions, self.shading = positions, shading
+        self.wrapped = np.zeros(count, dtype=bool)
+        self._bind_rows()
+        if count > keep:
+            self._spawn(keep)
+        self.trails.resize(count=count)
+
+    def snapshot(self):
+        """Raw fixed-point state, trails and the RNG position as a dict of arrays (see restore)"""
+        return {
+            "positions": self.positions,
+            "shading": self.shading,
+            "wrapped": self.wrapped,
+            "trail_data": self.trails.data,
+            "trail_head": self.trails.head,
+            "trail_length": self.trails.length,
+            "system": np.array([self.window_width, self.window_height, self.detail]),
+            "rng_state": np.array(json.dumps(self.rng.bit_generator.state)),
+        }
+
+    @classmethod
+    def restore(cls, arrays):
+        """Rebuild a system from snapshot() arrays; it continues exactly where the original was"""
+        width, height, detail = (int(value) for value in arrays["system"])
+        system = cls(0, width, height)
+        system.count = arrays["positions"].shape[1]
+        system.positions = np.array(arrays["positions"], dtype=np.int32)
+        system.shading = np.array(arrays["shading"], dtype=np.uint8)
+        system.wrapped = np.array(arrays["wrapped"], dtype=bool)
+        system._bind_rows()
+        system.trails.restore(arrays["trail_data"], arrays["trail_head"], arrays["trail_length"])
+        system.rng.bit_generator.state = json.loads(str(arrays["rng_state"]))
+        system.detail = detail
+        return system
+
+    @property
+    def nbytes(self):
+        """Resident bytes of the particle state and trail history"""
+        return (self.positions.nbytes + self.shading.nbytes + self.wrapped.nbytes + self._scratch.nbytes
+                + self.trails.nbytes)
+
+    def view(self, index):
+        return Particle(system=self, index=index)
+
+    def views(self, count=None):
+        """Read-only particle views for the first `count` particles (all by default)"""
+        count = self.count if count is None else min(count, self.count)
+        return [Particle(system=self, index=i) for i in range(count)]
+
+
+def _particle_worker(conn, state_name, count, start, stop, seed):
+    """Worker process loop: advect particles [start, stop) of the shared state on request"""
+    state_memory = shared_memory.SharedMemory(name=state_name)
+    fields = len(ParticleSystem.STATE_FIELDS)
+    buffers = np.ndarray((2, fields, count), dtype=np.float32, buffer=state_memory.buf)
+    wrapped = np.ndarray((count,), dtype=bool, buffer=state_memory.buf, offset=buffers.nbytes)
+    grid_memory = None
+    rng = np.random.default_rng(seed)
+
+    try:
+        while True:
+            command = conn.recv()
+            if command[0] == "stop":
+                break
+            if command[0] == "grid":
+                if grid_memory is not None:
+                    grid_memory.close()
+                grid_memory = shared_memory.SharedMemory(name=command[1])
+                continue
+
+            _, source, target, grid_shape, has_flow, detail, width, height = command
+            block = buffers[target, :, start:stop]
+            block[:] = buffers[source, :, start:stop]
+            grid = np.ndarray(grid_shape, dtype=np.float32, buffer=grid_memory.buf)
+            flow = None
+            if has_flow:
+                flow = np.ndarray(FlowField.shape_for(grid_shape), dtype=np.float32,
+                                  buffer=grid_memory.buf, offset=grid.nbytes)
+            advect_particles(block, wrapped[start:stop], grid, detail, width, height, rng, flow)
+            del grid, flow
+            conn.send(True)
+    finally:
+        del buffers, wrapped
+        state_memory.close()
+        if grid_memory is not None:
+            grid_memory.close()
+
+
+class ParticleWorkerPool:
+    """Advects a ParticleSystem in worker processes over double-buffered shared memory
+
+    The system's arrays are rebound to the front buffer. submit() starts the workers writing
+    the next frame into the back buffer while the main process renders the front one, and
+    wait() collects the result and swaps the buffers.
+    """
+
+    def __init__(self, system, workers=WORKER_COUNT):
+        self.system = system
+        self.workers = max(1, min(workers, system.count))
+        count, fields = system.count, len(ParticleSystem.STATE_FIELDS)
+
+        state_bytes = 2 * fields * count * 4
+        self.state_memory = shared_memory.SharedMemory(create=True, size=state_bytes + count)
+        self.buffers = np.ndarray((2, fields, count), dtype=np.float32, buffer=self.state_memory.buf)
+        self.wrapped = np.ndarray((count,), dtype=bool, buffer=self.state_memory.buf, offset=state_bytes)
+        self.front = 0
+        self.buffers[self.front] = system.state
+        system.bind_state(self.buffers[self.front], self.wrapped)
+
+        self.grid_memory = None
+        self.grid_shape = (0, 0)
+        self.grid_source = None
+        self.flow_source = None
+        self.pending = False
+
+        bounds = np.linspace(0, count, self.workers + 1).astype(int)
+        seeds = system.rng.integers(0, 2 ** 32, self.workers)
+        self.connections = []
+        self.processes = []
+        for worker in range(self.workers):
+            parent_conn, child_conn = mp.Pipe()
+            process = mp.Process(
+                target=_particle_worker,
+                args=(child_conn, self.state_memory.name, count,
+                      bounds[worker], bounds[worker + 1], int(seeds[worker])),
+                daemon=True,
+            )
+            process.start()
+            self.connections.append(parent_conn)
+            self.processes.append(process)
+
+    def set_grid(self, brightness_grid, flow=None):
+        """Copy a new brightness grid and optional flow field into shared memory (only between steps)"""
+        self.wait()
+        self.grid_source = brightness_grid
+        self.flow_source = flow
+        size = brightness_grid.nbytes + (flow.nbytes if flow is not None else 0)
+        if self.grid_memory is None or size > self.grid_memory.size:
+            old_memory = self.grid_memory
+            self.grid_memory = shared_memory.SharedMemory(create=True, size=max(4, size))
+            for conn in self.connections:
+                conn.send(("grid", self.grid_memory.name))
+            if old_memory is not None:
+                old_memory.close()
+                old_memory.unlink()
+        self.grid_shape = brightness_grid.shape
+        grid = np.ndarray(self.grid_shape, dtype=np.float32, buffer=self.grid_memory.buf)
+        grid[:] = brightness_grid
+        if flow is not None:
+            shared_flow = np.ndarray(flow.shape, dtype=np.float32, buffer=self.grid_memory.buf, offset=grid.nbytes)
+            shared_flow[:] = flow
+            del shared_flow
+        del grid
+
+    def submit(self, brightness_grid, flow=None):
+        """Start advancing the front buffer into the back buffer"""
+        if brightness_grid is not self.grid_source or flow is not self.flow_source:
+            self.set_grid(brightness_grid, flow)
+        system = self.system
+        command = ("step", self.front, 1 - self.front, self.grid_shape, flow is not None, system.detail,
+                   system.window_width, system.window_height)
+        for conn in self.connections:
+            conn.send(command)
+        self.pending = True
+
+    def wait(self):
+        """Collect the step in flight and make its result the front buffer"""
+        if not self.pending:
+            return
+        for conn in self.connections:
+            conn.recv()
+        self.pending = False
+
+        # The old front still holds the pre-update state for the trail history
+        system = self.system
+        old = self.buffers[self.front]
+        system.trails.push(old[0], old[1], old[7], old[8])
+        self.front = 1 - self.front
+        system.bind_state(self.buffers[self.front], self.wrapped)
+        system.trails.reset(self.wrapped)
+
+    def close(self):
+        """Stop the workers and hand the system back a private copy of its state"""
+        self.wait()
+        for conn in self.connections:
+            conn.send(("stop",))
+        for process in self.processes:
+            process.join(timeout=2)
+        self.system.bind_state(self.buffers[self.front].copy(), self.wrapped.copy())
+
+        del self.buffers, self.wrapped
+        self.state_memory.close()
+        self.state_memory.unlink()
+        if self.grid_memory is not None:
+            self.grid_memory.close()
+            self.grid_memory.unlink()
+
+
+def _particle_field(name):
+    """Property forwarding a Particle attribute to its slot in the ParticleSystem arrays"""
+    def getter(self):
+        return float(getattr(self.system, name)[self.index])
+
+    def setter(self, value):
+        if isinstance(self.system, CompactParticleSystem):
+            raise AttributeError(f"'{name}' is read-only on a view of a fixed-point particle system")
+        getattr(self.system, name)[self.index] = value
+
+    return property(getter, setter)
+
+
+class Particle:
+    """Single-particle view onto a ParticleSystem, with trail history"""
+    __slots__ = ['system', 'index']
+
+    x = _particle_field('x')
+    y = _particle_field('y')
+    prev_x = _particle_field('prev_x')
+    prev_y = _particle_field('prev_y')
+    speed = _particle_field('speed')
+    velocity_x = _particle_field('velocity_x')
+    velocity_y = _particle_field('velocity_y')
+    alpha = _particle_field('alpha')
+    depth = _particle_field('depth')
+
+    def __init__(self, x=None, y=None, window_width=WINDOW_WIDTH, window_height=WINDOW_HEIGHT,
+                 system=None, index=0, seed=None):
+        # A standalone particle gets its own single-element system, and with it a seeded RNG
+        if system is None:
+            system = ParticleSystem(1, window_width, window_height,
+                                    x=None if x is None else [x], y=None if y is None else [y], seed=seed)
+        self.system = system
+        self.index = index
+
+    @property
+    def window_width(self):
+        return self.system.window_width
+
+    @property
+    def window_height(self):
+        return self.system.window_height
+
+    @property
+    def max_trail_length(self):
+        return self.system.trails.max_length
+
+    @property
+    def trail_history(self):
+        """(x, y, alpha, depth) tuples from the system's trail store, oldest first"""
+        return [tuple(entry) for entry in self.system.trails.history(self.index).tolist()]
+
+    def update(self, brightness_grid, grid_width, grid_height, flow=None):
         # Store previous position for trail with alpha info
-        self.trail_history.append((self.x, self.y, self.alpha, self.depth))
-        if len(self.trail_history) > self.max_trail_length:
-            self.trail_history.pop(0)
+        trails = self.system.trails
+        trails.push_one(self.index, self.x, self.y, self.alpha, self.depth)
 
         # Get brightness value from grid with bounds checking
         if brightness_grid is not None and grid_width > 0 and grid_height > 0:
-            grid_x = max(0, min(int(self.x / DETAIL), grid_width - 1))
-            grid_y = max(0, min(int(self.y / DETAIL), grid_height - 1))
+            grid_x = max(0, min(int(self.x / self.system.detail), grid_width - 1))
+            grid_y = max(0, min(int(self.y / self.system.detail), grid_height - 1))
             brightness = brightness_grid[grid_y][grid_x]
         else:
             brightness = 0.5
@@ -81,24 +1629,28 @@ class Particle:
 
         # Update position
         self.prev_x, self.prev_y = self.x, self.y
+        if flow is not None and flow.size:
+            flow_x, flow_y = sample_flow(flow, np.float32([self.x]), np.float32([self.y]), self.system.detail)
+            self.x += flow_x[0]
+            self.y += flow_y[0]
         self.x += (1 - brightness) * 2.5 + self.velocity_x
         self.y += self.velocity_y * 0.3
 
         # Wrap around screen
         if self.x > self.window_width:
             self.x = 0
-            self.y = random.uniform(0, self.window_height)
-            self.trail_history.clear()
+            self.y = self.system.rng.uniform(0, self.window_height)
+            trails.reset(self.index)
         elif self.x < 0:
             self.x = self.window_width
-            self.trail_history.clear()
+            trails.reset(self.index)
 
         if self.y > self.window_height:
             self.y = 0
-            self.trail_history.clear()
+            trails.reset(self.index)
         elif self.y < 0:
             self.y = self.window_height
-            self.trail_history.clear()
+            trails.reset(self.index)
 
         # Update alpha and depth
         self.alpha = min(1.0, brightness * 0.9 + 0.1)
@@ -113,35 +1665,32 @@ class Particle:
     def _draw_normal(self, screen):
         if self.alpha <= 0:
             return
-        color = (*PARTICLE_COLOR, max(0, min(255, int(self.alpha * 255))))
-        surf = pygame.Surface((PARTICLE_SIZE * 2, PARTICLE_SIZE * 2), pygame.SRCALPHA)
-        pygame.draw.circle(surf, color, (PARTICLE_SIZE, PARTICLE_SIZE), PARTICLE_SIZE)
-        screen.blit(surf, (int(self.x - PARTICLE_SIZE), int(self.y - PARTICLE_SIZE)))
+        stamp = SPRITE_ATLAS.get(PARTICLE_SIZE, PARTICLE_COLOR, max(0, min(255, int(self.alpha * 255))))
+        SPRITE_ATLAS.blits(screen, [(stamp, (int(self.x - PARTICLE_SIZE), int(self.y - PARTICLE_SIZE)))])
 
     def _draw_3d(self, screen):
         if self.alpha <= 0:
             return
         offset = int(DEPTH_OFFSET * self.depth)
+        alpha = max(0, min(255, int(self.alpha * 180)))
         
-        # Red channel
-        red_surf = pygame.Surface((PARTICLE_SIZE * 2, PARTICLE_SIZE * 2), pygame.SRCALPHA)
-        red_color = (*RED_CHANNEL, max(0, min(255, int(self.alpha * 180))))
-        pygame.draw.circle(red_surf, red_color, (PARTICLE_SIZE, PARTICLE_SIZE), PARTICLE_SIZE)
-        screen.blit(red_surf, (int(self.x - PARTICLE_SIZE - offset), int(self.y - PARTICLE_SIZE)))
-        
-        # Blue channel
-        blue_surf = pygame.Surface((PARTICLE_SIZE * 2, PARTICLE_SIZE * 2), pygame.SRCALPHA)
-        blue_color = (*BLUE_CHANNEL, max(0, min(255, int(self.alpha * 180))))
-        pygame.draw.circle(blue_surf, blue_color, (PARTICLE_SIZE, PARTICLE_SIZE), PARTICLE_SIZE)
-        screen.blit(blue_surf, (int(self.x - PARTICLE_SIZE + offset), int(self.y - PARTICLE_SIZE)))
+        # Red and blue channel
+        SPRITE_ATLAS.blits(screen, [
+            (SPRITE_ATLAS.get(PARTICLE_SIZE, RED_CHANNEL, alpha),
+             (int(self.x - PARTICLE_SIZE - offset), int(self.y - PARTICLE_SIZE))),
+            (SPRITE_ATLAS.get(PARTICLE_SIZE, BLUE_CHANNEL, alpha),
+             (int(self.x - PARTICLE_SIZE + offset), int(self.y - PARTICLE_SIZE))),
+        ])
 
     def draw_trail(self, screen, enable_3d=False):
         """Draw trail with fade effect"""
-        if len(self.trail_history) < 2:
+        trail_history = self.trail_history
+        if len(trail_history) < 2:
             return
             
-        for i, (old_x, old_y, old_alpha, old_depth) in enumerate(self.trail_history):
-            trail_progress = (i + 1) / len(self.trail_history)
+        stamps = []
+        for i, (old_x, old_y, old_alpha, old_depth) in enumerate(trail_history):
+            trail_progress = (i + 1) / len(trail_history)
             trail_alpha = old_alpha * trail_progress * 0.6
             trail_size = max(1, int(PARTICLE_SIZE * (0.5 + trail_progress * 0.5)))
             
@@ -150,23 +1699,596 @@ class Particle:
                 
             if enable_3d:
                 offset = int(DEPTH_OFFSET * old_depth * trail_progress)
+                alpha = max(0, min(255, int(trail_alpha * 120)))
                 
-                # Red trail
-                red_surf = pygame.Surface((trail_size * 2, trail_size * 2), pygame.SRCALPHA)
-                red_color = (*RED_CHANNEL, max(0, min(255, int(trail_alpha * 120))))
-                pygame.draw.circle(red_surf, red_color, (trail_size, trail_size), trail_size)
-                screen.blit(red_surf, (int(old_x - trail_size - offset), int(old_y - trail_size)))
-                
-                # Blue trail
-                blue_surf = pygame.Surface((trail_size * 2, trail_size * 2), pygame.SRCALPHA)
-                blue_color = (*BLUE_CHANNEL, max(0, min(255, int(trail_alpha * 120))))
-                pygame.draw.circle(blue_surf, blue_color, (trail_size, trail_size), trail_size)
-                screen.blit(blue_surf, (int(old_x - trail_size + offset), int(old_y - trail_size)))
+                # Red and blue trail
+                stamps.append((SPRITE_ATLAS.get(trail_size, RED_CHANNEL, alpha),
+                               (int(old_x - trail_size - offset), int(old_y - trail_size))))
+                stamps.append((SPRITE_ATLAS.get(trail_size, BLUE_CHANNEL, alpha),
+                               (int(old_x - trail_size + offset), int(old_y - trail_size))))
+            else:
+                alpha = max(0, min(255, int(trail_alpha * 255)))
+                stamps.append((SPRITE_ATLAS.get(trail_size, PARTICLE_COLOR, alpha),
+                               (int(old_x - trail_size), int(old_y - trail_size))))
+        SPRITE_ATLAS.blits(screen, stamps)
+
+
+class ParticleSplatter:
+    """Turns particles into the pixels their circles cover, for the NumPy render back ends
+
+    Circles use the exact pixel footprint of pygame.draw.circle. Subclasses set the index
+    layout (`x_stride`, `y_stride`) in resize() and store the per-pixel alpha in _add().
+    """
+
+    def __init__(self, width, height):
+        self._stamps = {}
+        self.resize(width, height)
+
+    def _stamp(self, radius):
+        """Pixel offsets covered by a circle of `radius`, taken from pygame.draw.circle itself"""
+        if radius not in self._stamps:
+            surf = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+            pygame.draw.circle(surf, (255, 255, 255, 255), (radius, radius), radius)
+            dx, dy = np.nonzero(pygame.surfarray.array_alpha(surf))
+            self._stamps[radius] = (dx.astype(np.int32), dy.astype(np.int32))
+        return self._stamps[radius]
+
+    def splat(self, x, y, alpha, color, radius=PARTICLE_SIZE, offset_x=0):
+        """Accumulate circles of `radius` at (x, y) with per-particle alpha (0-1)
+
+        `offset_x` is a scalar or per-particle horizontal shift (the anaglyph offset).
+        """
+        visible = alpha > 0
+        if not np.any(visible):
+            return
+        x, y, alpha = x[visible], y[visible], alpha[visible]
+        if np.ndim(offset_x):
+            offset_x = np.asarray(offset_x)[visible]
+
+        # Same placement as blitting a (2r x 2r) stamp at (int(x - r - offset), int(y - r))
+        left = (x - radius - offset_x).astype(np.int32)
+        top = (y - radius).astype(np.int32)
+        dx, dy = self._stamp(radius)
+        base = left * self.x_stride + top * self.y_stride
+        offsets = dx * self.x_stride + dy * self.y_stride
+
+        # Stamps fully on screen index straight into the buffer, only edge stamps need clipping
+        inner = (left >= 0) & (left <= self.width - radius * 2) & (top >= 0) & (top <= self.height - radius * 2)
+        index = (base[inner, None] + offsets).ravel()
+        weights = np.repeat(alpha[inner], len(offsets))
+        if not np.all(inner):
+            px = (left[~inner, None] + dx).ravel()
+            py = (top[~inner, None] + dy).ravel()
+            inside = (px >= 0) & (px < self.width) & (py >= 0) & (py < self.height)
+            index = np.concatenate((index, (px * self.x_stride + py * self.y_stride)[inside]))
+            weights = np.concatenate((weights, np.repeat(alpha[~inner], len(offsets))[inside]))
+
+        self._add(tuple(color), index, weights)
+
+    def splat_particles(self, system, enable_3d=False, alpha_scale=1.0, anaglyph_alpha_scale=180 / 255):
+        """Splat a ParticleSystem, as two offset red/blue passes in 3D mode"""
+        if enable_3d:
+            alpha = system.alpha * anaglyph_alpha_scale
+            offset = (DEPTH_OFFSET * system.depth).astype(np.int32)
+            self.splat(system.x, system.y, alpha, RED_CHANNEL, offset_x=offset)
+            self.splat(system.x, system.y, alpha, BLUE_CHANNEL, offset_x=-offset)
+        else:
+            self.splat(system.x, system.y, system.alpha * alpha_scale, PARTICLE_COLOR)
+
+    def splat_trails(self, trails, enable_3d=False, count=None):
+        """Splat the trail store with the same fade and size ramp as Particle.draw_trail"""
+        points, valid = trails.ordered(count)
+        length = trails.length[:len(points), None]
+        valid &= length >= 2
+        progress = (np.arange(trails.max_length) + 1) / np.maximum(length, 1)
+        alpha = points[:, :, 2] * progress * 0.6
+        valid &= alpha > 0.01
+        size = np.maximum(1, (PARTICLE_SIZE * (0.5 + progress * 0.5)).astype(np.int32))
+
+        for radius in np.unique(size[valid]).tolist():
+            selected = valid & (size == radius)
+            x, y = points[:, :, 0][selected], points[:, :, 1][selected]
+            if enable_3d:
+                offset = (DEPTH_OFFSET * points[:, :, 3] * progress).astype(np.int32)[selected]
+                trail_alpha = alpha[selected] * (120 / 255)
+                self.splat(x, y, trail_alpha, RED_CHANNEL, radius, offset_x=offset)
+                self.splat(x, y, trail_alpha, BLUE_CHANNEL, radius, offset_x=-offset)
+            else:
+                self.splat(x, y, alpha[selected], PARTICLE_COLOR, radius)
+
+
+class ParticleRasterizer(ParticleSplatter):
+    """Splats particles into per-color alpha values and uploads only the pixels they cover
+
+    Alpha is accumulated additively per color and clamped on upload. Covered pixels get a slot
+    in compact arrays (`pixels`, `offsets`, one `values` array per color), so clearing,
+    compositing and the upload - one scatter of packed pixels into the surface buffer - cost
+    what the particles cover rather than the window size.
+    """
+
+    def resize(self, width, height):
+        self.width = width
+        self.height = height
+        self.x_stride, self.y_stride = height, 1  # x-major like pygame.surfarray, x * height + y
+        self.slot = np.full(width * height, -1, dtype=np.int32)  # pixel -> position in the arrays below
+        self.pixels = np.empty(0, dtype=np.int32)
+        self.offsets = np.empty(0, dtype=np.int32)  # row-major y * width + x, for the buffer upload
+        self.values = {}  # color -> summed alpha per slot
+        self._touched = set()
+        self.surface = pygame.Surface((width, height), pygame.SRCALPHA)
+
+    def clear(self):
+        # Drop colors the last frame did not splat so switching steps stops compositing empty planes
+        self.slot[self.pixels] = -1
+        self.pixels = self.pixels[:0]
+        self.offsets = self.offsets[:0]
+        self.values = {color: value[:0] for color, value in self.values.items() if color in self._touched}
+        self._touched.clear()
+
+    def _slots(self, index):
+        """Slots of the pixels in `index`, adding the ones not covered yet"""
+        slots = self.slot[index]
+        new = index[slots < 0]
+        if new.size:
+            # Duplicates all write the slot array; each pixel keeps the one entry that won
+            start = len(self.pixels)
+            order = np.arange(start, start + len(new), dtype=np.int32)
+            self.slot[new] = order
+            new = new[self.slot[new] == order]
+            self.slot[new] = np.arange(start, start + len(new), dtype=np.int32)
+            self.pixels = np.concatenate((self.pixels, new))
+            self.offsets = np.concatenate((self.offsets, new % self.height * self.width + new // self.height))
+            zeros = np.zeros(len(new), dtype=np.float32)
+            self.values = {color: np.concatenate((value, zeros)) for color, value in self.values.items()}
+            slots = self.slot[index]
+        return slots
+
+    def _add(self, color, index, weights):
+        self._touched.add(color)
+        slots = self._slots(index)
+        if color not in self.values:
+            self.values[color] = np.zeros(len(self.pixels), dtype=np.float32)
+        np.add.at(self.values[color], slots, weights.astype(np.float32))
+
+    def coverage(self):
+        coverage = np.zeros(len(self.pixels), dtype=np.float32)
+        for value in self.values.values():
+            coverage += value
+        return coverage
+
+    def _compose(self, surface, background=None):
+        """Covered pixels packed for `surface`, optionally over a solid background, plus coverage"""
+        coverage = self.coverage()
+        np.minimum(coverage, 1, out=coverage)
+        # Other depths are packed as 8-bit RGB and converted by _upload
+        shifts = surface.get_shifts() if surface.get_bytesize() == 4 else (16, 8, 0, 24)
+        packed = np.zeros(len(self.pixels), dtype=np.uint32)
+        scratch = np.empty(len(self.pixels), dtype=np.float32)
+        product = np.empty(len(self.pixels), dtype=np.float32)
+        channels = {}  # channels with identical inputs (e.g. white particles) are computed once
+        for channel in range(3):
+            weights = tuple(color[channel] for color in self.values)
+            base = 0 if background is None else background[channel]
+            if not any(weights) and not base:
+                continue
+            if (weights, base) not in channels:
+                scratch.fill(0)
+                for weight, value in zip(weights, self.values.values()):
+                    if weight:
+                        np.multiply(value, weight, out=product)
+                        scratch += product
+                if background is None:
+                    # Un-premultiply for an SRCALPHA upload
+                    np.divide(scratch, np.maximum(coverage, 1e-6), out=scratch)
+                elif base:
+                    scratch += (1 - coverage) * base
+                np.minimum(scratch, 255, out=scratch)
+                channels[weights, base] = scratch.astype(np.uint32)
+            packed |= channels[weights, base] << shifts[channel]
+        if background is None:
+            packed |= (coverage * 255).astype(np.uint32) << shifts[3]
+        return packed, coverage
+
+    def _upload(self, surface, packed):
+        """Scatter packed pixels into the surface buffer at the covered offsets"""
+        if surface.get_bytesize() != 4:
+            # Rare non-32-bit display: write 8-bit channels, or let pygame map them to the format
+            rgb = np.stack((packed >> 16, packed >> 8, packed), axis=-1).astype(np.uint8)
+            x, y = self.pixels // self.height, self.pixels % self.height
+            if surface.get_bytesize() == 3:
+                pixels = pygame.surfarray.pixels3d(surface)
+                pixels[x, y] = rgb
+            else:
+                pixels = pygame.surfarray.pixels2d(surface)
+                pixels[x, y] = pygame.surfarray.map_array(surface, rgb[:, np.newaxis])[:, 0]
+            del pixels
+            return
+        pitch = surface.get_pitch() // 4
+        offsets = self.offsets
+        if pitch != self.width:
+            offsets = offsets + offsets // self.width * (pitch - self.width)
+        buffer = np.frombuffer(surface.get_buffer(), dtype=np.uint32)
+        buffer[offsets] = packed
+        del buffer  # release the surface lock
+
+    def present(self, screen, background=BACKGROUND_COLOR):
+        """Fill `screen` with the background and write the covered pixels straight into it"""
+        screen.fill(background)
+        if len(self.pixels):
+            self._upload(screen, self._compose(screen, background)[0])
+
+    def to_surface(self):
+        """Write the covered pixels into the reusable SRCALPHA surface and return it for blitting"""
+        self.surface.fill((0, 0, 0, 0))
+        if len(self.pixels):
+            self._upload(self.surface, self._compose(self.surface)[0])
+        return self.surface
+
+    def planes(self):
+        """Full-window alpha plane per color (x-major), e.g. for snapshots"""
+        planes = {}
+        for color, value in self.values.items():
+            planes[color] = np.zeros(self.width * self.height, dtype=np.float32)
+            planes[color][self.pixels] = value
+        return planes
+
+    def restore(self, planes):
+        """Replace the accumulated alpha with full-window planes from planes()"""
+        self.slot[self.pixels] = -1
+        coverage = sum(planes.values(), np.zeros(self.width * self.height, dtype=np.float32))
+        self.pixels = np.flatnonzero(coverage).astype(np.int32)
+        self.slot[self.pixels] = np.arange(len(self.pixels), dtype=np.int32)
+        self.offsets = self.pixels % self.height * self.width + self.pixels // self.height
+        self.values = {color: plane[self.pixels].astype(np.float32) for color, plane in planes.items()}
+        self._touched = set(planes)
+
+
+class TrailLayer(ParticleSplatter):
+    """Persistent trail accumulation held as NumPy planes instead of an SRCALPHA surface
+
+    One row-major (height, width) float32 plane per color holds the trail level (0-255) and is
+    never cleared: each frame fades it with one in-place multiply, new splats are added in bulk
+    and clamped at 255, and present() converts the planes to packed pixels written straight
+    into the screen buffer. All of this runs over `rows`, the rows trails can reach, only;
+    every TRAIL_SWEEP_INTERVAL frames levels below TRAIL_CUTOFF are zeroed and `rows` shrunk.
+    """
+
+    def resize(self, width, height):
+        self.width = width
+        self.height = height
+        self.x_stride, self.y_stride = 1, width  # row-major like the surface buffer, y * width + x
+        self.levels = {}  # color -> (height, width) float32 trail level
+        self.rows = (0, 0)  # first and past-the-last row with any trail
+        self._sum = np.empty((height, width), dtype=np.float32)
+        self._channel = np.empty((height, width), dtype=np.uint32)
+        self.frames_since_sweep = 0
+
+    def clear(self):
+        self.levels = {}
+        self.rows = (0, 0)
+
+    def _add(self, color, index, weights):
+        if color not in self.levels:
+            self.levels[color] = np.zeros((self.height, self.width), dtype=np.float32)
+        level = self.levels[color].reshape(-1)
+        np.add.at(level, index, (weights * 255).astype(np.float32))
+        level[index] = np.minimum(level[index], 255)
+
+        first, stop = index.min() // self.width, index.max() // self.width + 1
+        if self.rows[0] < self.rows[1]:
+            first, stop = min(first, self.rows[0]), max(stop, self.rows[1])
+        self.rows = (int(first), int(stop))
+
+    def fade(self, amount=TRAIL_FADE):
+        decay = np.float32(1 - amount)
+        first, stop = self.rows
+        for level in self.levels.values():
+            rows = level[first:stop]
+            np.multiply(rows, decay, out=rows)
+
+    def accumulate(self, system, enable_3d=False, fade=TRAIL_FADE):
+        """Fade the existing trails and splat the current particle positions on top"""
+        self.fade(fade)
+        self.splat_particles(system, enable_3d, alpha_scale=120 / 255, anaglyph_alpha_scale=100 / 255)
+        self.frames_since_sweep += 1
+        if self.frames_since_sweep >= TRAIL_SWEEP_INTERVAL:
+            self.sweep()
+
+    def sweep(self, cutoff=TRAIL_CUTOFF):
+        """Zero levels below `cutoff` coverage, then shrink `rows` and drop colors that faded out"""
+        self.frames_since_sweep = 0
+        first, stop = self.rows
+        lit = np.zeros(stop - first, dtype=bool)
+        levels = {}
+        for color, level in self.levels.items():
+            rows = level[first:stop]
+            rows[rows < cutoff * 255] = 0  # also keeps the fade out of denormal floats
+            lit_rows = rows.any(axis=1)
+            if lit_rows.any():
+                levels[color] = level
+                lit |= lit_rows
+        self.levels = levels
+        lit = np.flatnonzero(lit)
+        self.rows = (first + int(lit[0]), first + int(lit[-1]) + 1) if len(lit) else (0, 0)
+
+    def _pack(self, out, shifts, background):
+        """Composite `rows` over `background` into `out`, 8-bit channels packed at `shifts`"""
+        first, stop = self.rows
+        levels = [(color, level[first:stop]) for color, level in self.levels.items()]
+        total, channel = self._sum[first:stop], self._channel[first:stop]
+
+        # Channels with identical inputs (e.g. white trails) are computed once and placed with
+        # one multiply, as every channel value fits in its own byte
+        placement = {}
+        for index in range(3):
+            inputs = (tuple(color[index] for color, _ in levels), background[index])
+            if any(inputs[0]) or inputs[1]:
+                placement[inputs] = placement.get(inputs, 0) + (1 << shifts[index])
+        if not placement:
+            out.fill(0)
+            return
+
+        remaining = None
+        if any(background):
+            # Uncovered share of each pixel, 1 - coverage
+            remaining = np.zeros(total.shape, dtype=np.float32)
+            for _, level in levels:
+                remaining += level
+            np.minimum(remaining, 255, out=remaining)
+            np.subtract(1, remaining / 255, out=remaining)
+
+        # A channel already in the lowest byte (e.g. blue) converts straight into `out`
+        order = sorted(placement.items(), key=lambda item: item[1] != 1)
+        for count, ((weights, base), multiplier) in enumerate(order):
+            terms = [(level, weight / 255) for (_, level), weight in zip(levels, weights) if weight]
+            if base:
+                terms.append((remaining, base))
+            if len(terms) == 1 and terms[0][1] == 1:
+                source = terms[0][0]  # a full-weight color is its own channel
+            else:
+                source = total
+                source.fill(0)
+                for level, weight in terms:
+                    source += level * np.float32(weight)
+                np.minimum(source, 255, out=source)
+            # Truncates like the float rasterizer
+            if count == 0 and multiplier == 1:
+                np.copyto(out, source, casting="unsafe")
+                continue
+            np.copyto(channel, source, casting="unsafe")
+            if count == 0:
+                np.multiply(channel, np.uint32(multiplier), out=out)
             else:
-                trail_surf = pygame.Surface((trail_size * 2, trail_size * 2), pygame.SRCALPHA)
-                trail_color = (*PARTICLE_COLOR, max(0, min(255, int(trail_alpha * 255))))
-                pygame.draw.circle(trail_surf, trail_color, (trail_size, trail_size), trail_size)
-                screen.blit(trail_surf, (int(old_x - trail_size), int(old_y - trail_size)))
+                np.multiply(channel, np.uint32(multiplier), out=channel)
+                np.bitwise_or(out, channel, out=out)
+
+    def present(self, screen, background=BACKGROUND_COLOR):
+        """Fill `screen` with the background and write the trail rows straight into its buffer"""
+        first, stop = self.rows
+        if first == stop:
+            screen.fill(background)
+            return
+        screen.fill(background, (0, 0, self.width, first))
+        screen.fill(background, (0, stop, self.width, self.height - stop))
+        if screen.get_bytesize() == 4:
+            buffer = np.frombuffer(screen.get_buffer(), dtype=np.uint32).reshape(self.height, -1)
+            self._pack(buffer[first:stop, :self.width], screen.get_shifts(), background)
+            del buffer  # release the surface lock
+            return
+
+        # Rare non-32-bit display: write 8-bit channels, or let pygame map them to the format
+        packed = np.empty((stop - first, self.width), dtype=np.uint32)
+        self._pack(packed, (16, 8, 0, 24), background)
+        rgb = np.stack((packed >> 16, packed >> 8, packed), axis=-1).astype(np.uint8).transpose(1, 0, 2)
+        if screen.get_bytesize() == 3:
+            pixels = pygame.surfarray.pixels3d(screen)
+            pixels[:, first:stop] = rgb
+        else:
+            pixels = pygame.surfarray.pixels2d(screen)
+            pixels[:, first:stop] = pygame.surfarray.map_array(screen, rgb)
+        del pixels
+
+    def planes(self):
+        """Full-window trail level plane (0-255) per color, x-major like ParticleRasterizer.planes()"""
+        return {color: level.T.reshape(-1) for color, level in self.levels.items()}
+
+    def restore(self, planes):
+        """Replace the trails with full-window planes from planes()"""
+        self.levels = {color: np.ascontiguousarray(plane.astype(np.float32).reshape(self.width, self.height).T)
+                       for color, plane in planes.items()}
+        self.rows = (0, self.height) if self.levels else (0, 0)
+
+
+class LayerCache:
+    """Full-window surfaces for static content, rendered once and reused until invalidated
+
+    get(name, render) calls render() only the first time `name` is asked for after an
+    invalidate(); the effect invalidates on resize, image load and grid changes.
+    """
+
+    def __init__(self):
+        self.surfaces = {}
+
+    def get(self, name, render):
+        surface = self.surfaces.get(name)
+        if surface is None:
+            surface = self.surfaces[name] = render()
+        return surface
+
+    def invalidate(self):
+        self.surfaces.clear()
+
+
+class FrameProfiler:
+    """Per-frame phase timings with rolling percentiles, an overlay and trace export"""
+
+    def __init__(self, window=PROFILER_WINDOW, trace_frames=PROFILER_TRACE_FRAMES):
+        self.window = window
+        self.samples = OrderedDict()  # phase -> deque of recent milliseconds
+        self.trace = deque(maxlen=trace_frames)  # one {phase: ms} dict per frame
+        self.current = {}
+        self.frame_index = 0
+        self.last_frame_end = None
+
+    @contextmanager
+    def section(self, name):
+        """Time the enclosed block as phase `name` of the current frame"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.current[name] = self.current.get(name, 0.0) + elapsed
+
+    def end_frame(self):
+        """Close the current frame; 'frame' is the wall time since the previous end_frame"""
+        now = time.perf_counter()
+        if self.last_frame_end is not None:
+            self.current["frame"] = (now - self.last_frame_end) * 1000
+        self.last_frame_end = now
+
+        for name, elapsed in self.current.items():
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.window)
+            self.samples[name].append(elapsed)
+        self.trace.append({"frame_index": self.frame_index, **self.current})
+        self.frame_index += 1
+        self.current = {}
+
+    def percentiles(self, name, percentiles=PROFILER_PERCENTILES):
+        samples = self.samples.get(name)
+        if not samples:
+            return [0.0] * len(percentiles)
+        return np.percentile(np.fromiter(samples, dtype=np.float64), percentiles).tolist()
+
+    def summary(self):
+        """{phase: {"p50": ms, "p95": ms, ..., "mean": ms}} over the rolling window"""
+        result = {}
+        for name, samples in self.samples.items():
+            values = self.percentiles(name)
+            result[name] = {f"p{p}": round(v, 3) for p, v in zip(PROFILER_PERCENTILES, values)}
+            result[name]["mean"] = round(sum(samples) / len(samples), 3)
+        return result
+
+    def dump(self, path):
+        """Write the per-frame trace as CSV, or the summary plus trace as JSON (by extension)"""
+        if path.lower().endswith(".json"):
+            with open(path, "w") as f:
+                json.dump({"summary": self.summary(), "frames": list(self.trace)}, f, indent=1)
+        else:
+            columns = ["frame_index"] + list(self.samples)
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=columns, restval="")
+                writer.writeheader()
+                writer.writerows(self.trace)
+        print(f"Profiler trace written: {path} ({len(self.trace)} frames)")
+
+    def draw_overlay(self, screen, font):
+        """Table of rolling percentiles (ms) per phase in the top-left corner"""
+        rows = [["phase"] + [f"p{p}" for p in PROFILER_PERCENTILES]]
+        for name in self.samples:
+            rows.append([name] + [f"{value:.2f}" for value in self.percentiles(name)])
+
+        name_width, column_width = 130, 60
+        line_height = font.get_linesize()
+        panel = pygame.Surface((name_width + column_width * len(PROFILER_PERCENTILES) + 20,
+                                line_height * len(rows) + 16), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 190))
+        for i, row in enumerate(rows):
+            y = 8 + i * line_height
+            panel.blit(font.render(row[0], True, (0, 255, 136)), (10, y))
+            for j, cell in enumerate(row[1:]):
+                text = font.render(cell, True, (0, 255, 136))
+                # Right-align numbers in their column
+                panel.blit(text, (10 + name_width + column_width * (j + 1) - text.get_width(), y))
+        screen.blit(panel, (10, 10))
+
+
+class QualityGovernor:
+    """Holds the target FPS by lowering or restoring one quality setting at a time
+
+    record() takes the work time of every animated frame (the frame limiter's sleep excluded).
+    Each full window of QUALITY_WINDOW frames, the median is compared with the frame budget:
+    above QUALITY_DOWNGRADE_RATIO of it the next setting is lowered, below QUALITY_UPGRADE_RATIO
+    the most recent downgrade is undone, but only after the upgrade delay. An upgrade that has
+    to be taken back within the delay doubles it, so the settings settle instead of oscillating.
+    """
+
+    def __init__(self, effect, fps=FPS):
+        self.effect = effect
+        self.enabled = ADAPTIVE_QUALITY
+        self.budget = 1.0 / fps
+        self.frame_times = deque(maxlen=QUALITY_WINDOW)
+        self.downgrades = []  # (setting, previous value), undone last first
+        self.upgrade_delay = QUALITY_UPGRADE_DELAY
+        self.last_change = self.last_upgrade = float("-inf")
+
+    def settings(self):
+        effect = self.effect
+        return {
+            "particles": effect.particle_count,
+            "trail_length": effect.trail_length,
+            "enable_3d": effect.enable_3d,
+            "update_frequency": effect.update_frequency,
+        }
+
+    def apply(self, setting, value):
+        if setting == "particles":
+            self.effect.set_particle_count(value)
+        elif setting == "trail_length":
+            self.effect.set_trail_length(value)
+        else:
+            setattr(self.effect, setting, value)
+        print(f"Adaptive quality: {setting} -> {value}")
+
+    def next_downgrade(self):
+        """(setting, value) one step below the current quality, or None at the lowest"""
+        effect = self.effect
+        if effect.show_trails and effect.trail_length > QUALITY_MIN_TRAIL_LENGTH:
+            return "trail_length", max(QUALITY_MIN_TRAIL_LENGTH, effect.trail_length // 2)
+        if effect.particle_count > QUALITY_MIN_PARTICLES:
+            return "particles", max(QUALITY_MIN_PARTICLES, int(effect.particle_count * QUALITY_PARTICLE_STEP))
+        if effect.enable_3d:
+            return "enable_3d", False
+        if effect.update_frequency < QUALITY_MAX_UPDATE_FREQUENCY:
+            return "update_frequency", effect.update_frequency + 1
+        return None
+
+    def record(self, frame_time, now=None):
+        """Add one frame's work time; returns the (setting, value) changed, if any"""
+        self.frame_times.append(frame_time)
+        if len(self.frame_times) < QUALITY_WINDOW:
+            return None
+        now = time.perf_counter() if now is None else now
+        median = sorted(self.frame_times)[QUALITY_WINDOW // 2]
+
+        if median > self.budget * QUALITY_DOWNGRADE_RATIO:
+            step = self.next_downgrade()
+            if step is None:
+                return None
+            if now - self.last_upgrade < self.upgrade_delay:
+                # The last upgrade did not fit after all, wait longer before trying again
+                self.upgrade_delay = min(self.upgrade_delay * 2, QUALITY_MAX_UPGRADE_DELAY)
+            setting, value = step
+            self.downgrades.append((setting, self.settings()[setting]))
+        elif median < self.budget * QUALITY_UPGRADE_RATIO and self.downgrades \
+                and now - self.last_change >= self.upgrade_delay:
+            setting, value = self.downgrades.pop()
+            self.last_upgrade = now
+        else:
+            return None
+
+        self.apply(setting, value)
+        self.last_change = now
+        self.frame_times.clear()
+        return setting, value
+
+    def restore(self):
+        """Undo every downgrade, back to the configured quality"""
+        while self.downgrades:
+            self.apply(*self.downgrades.pop())
+        self.frame_times.clear()
+        self.upgrade_delay = QUALITY_UPGRADE_DELAY
 
 
 class WindowPositioner:
@@ -284,44 +2406,89 @@ class WindowPositioner:
 
 
 class ParticleFlowEffect:
-    def __init__(self, window_position=WindowPosition.TOP_RIGHT, monitor_index=0, offset_x=50, offset_y=50):
+    def __init__(self, window_position=WindowPosition.TOP_RIGHT, monitor_index=0, offset_x=50, offset_y=50,
+                 headless=False, size=None):
+        # Headless mode renders off-screen through SDL's dummy video driver
+        self.headless = headless
+        if headless:
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
         pygame.init()
         
+        self.window_width, self.window_height = size or (WINDOW_WIDTH, WINDOW_HEIGHT)
+
         # Set window position before creating display
-        WindowPositioner.set_window_position(
-            window_position, WINDOW_WIDTH, WINDOW_HEIGHT, monitor_index, offset_x, offset_y
-        )
+        if not headless:
+            WindowPositioner.set_window_position(
+                window_position, self.window_width, self.window_height, monitor_index, offset_x, offset_y
+            )
         
-        self.window_width = WINDOW_WIDTH
-        self.window_height = WINDOW_HEIGHT
         self.screen = pygame.display.set_mode((self.window_width, self.window_height))
         pygame.display.set_caption("Particle Flow Effect")
         self.clock = pygame.time.Clock()
         self.font = pygame.font.Font(None, 28)
+        self.small_font = pygame.font.Font(None, 24)
 
         # Effect state
         self.current_step = 1
-        self.max_steps = 6
+        self.show_status = True
+        self.max_steps = 7
+        self.particle_system = None
         self.particles = []
+        self.particle_count = PARTICLE_COUNT
+        self.trail_length = MAX_TRAIL_LENGTH
+        self.particle_state = PARTICLE_STATE
+        self.seed = SEED
+        self.worker_count = WORKER_COUNT
+        self.worker_pool = None
         self.brightness_grid = []
-        self.original_image = None
+        self.image = None
+        self.image_digest = None
+        self.original_image = None  # self.image.surface, kept for drawing
+        self.detail = DETAIL
+        self.use_luminance = USE_LUMINANCE
+        self.image_loader = ImageLoader()
+        self.video = None
+        self.playlist = None
+        self.image_cache = None
+        self.slideshow = False
+        self.slideshow_interval = PLAYLIST_INTERVAL
+        self.next_slide_time = 0.0
+        self.flow_field = FlowField()
+        self.use_flow = ENABLE_FLOW_FIELD
         
         # Trail surface
         self.trail_surface = pygame.Surface((self.window_width, self.window_height), pygame.SRCALPHA)
         self.persistent_trail_surface = pygame.Surface((self.window_width, self.window_height), pygame.SRCALPHA)
+        self.rasterizer = ParticleRasterizer(self.window_width, self.window_height)
+        self.spatial_hash = SpatialHash(DENSITY_RADIUS, self.window_width, self.window_height)
+        self.trail_layer = TrailLayer(self.window_width, self.window_height)
+        self.fade_surface = self._create_fade_surface()
+        self.layers = LayerCache()
+        self.screen_layer = None  # static layer currently on screen, None after any other drawing
+        self.status_text = None  # status bar as last drawn, and where
+        self.status_rect = None
+        self.render_backend = RENDER_BACKEND
         self.enable_3d = ENABLE_3D
+        self.show_trails = False
 
         # Performance
+        self.fps = FPS  # frame rate; headless video playback advances 1 / fps per frame
         self.frame_count = 0
         self.update_frequency = 1
+        self.quality = QualityGovernor(self)
+        self.profiler = FrameProfiler()
+        self.show_profiler = False
+        self.profiler_font = pygame.font.Font(None, 20)
 
         self.load_default_image()
         self.init_particles()
 
     def resize_window(self, new_width, new_height, window_position=None):
         """Resize window with optional repositioning"""
-        new_width = max(MIN_WINDOW_WIDTH, min(MAX_WINDOW_WIDTH, new_width))
-        new_height = max(MIN_WINDOW_HEIGHT, min(MAX_WINDOW_HEIGHT, new_height))
+        # Off-screen output is not limited by the monitor
+        if not self.headless:
+            new_width = max(MIN_WINDOW_WIDTH, min(MAX_WINDOW_WIDTH, new_width))
+            new_height = max(MIN_WINDOW_HEIGHT, min(MAX_WINDOW_HEIGHT, new_height))
         
         if window_position:
             WindowPositioner.set_window_position(window_position, new_width, new_height)
@@ -333,69 +2500,210 @@ class ParticleFlowEffect:
         # Recreate surfaces
         self.trail_surface = pygame.Surface((self.window_width, self.window_height), pygame.SRCALPHA)
         self.persistent_trail_surface = pygame.Surface((self.window_width, self.window_height), pygame.SRCALPHA)
+        self.rasterizer.resize(self.window_width, self.window_height)
+        self.spatial_hash.resize(DENSITY_RADIUS, self.window_width, self.window_height)
+        self.trail_layer.resize(self.window_width, self.window_height)
+        self.fade_surface = self._create_fade_surface()
+        self.layers.invalidate()
+        self.screen_layer = None
         
         print(f"Window resized to: {self.window_width}x{self.window_height}")
 
+    def _create_fade_surface(self):
+        """Full-window fade overlay for the sprites trail path, built once per window size"""
+        fade_surface = pygame.Surface((self.window_width, self.window_height), pygame.SRCALPHA)
+        fade_surface.fill((0, 0, 0, int(TRAIL_FADE * 255)))
+        return fade_surface
+
+    def clear_trails(self):
+        self.trail_surface.fill((0, 0, 0, 0))
+        self.persistent_trail_surface.fill((0, 0, 0, 0))
+        self.trail_layer.clear()
+
     def load_default_image(self):
         """Generate default image pattern"""
-        image_array = np.zeros((self.window_height, self.window_width, 3), dtype=np.uint8)
-        
-        center_x, center_y = self.window_width // 2, self.window_height // 2
-        
-        for y in range(self.window_height):
-            for x in range(self.window_width):
-                # Spiral pattern
-                dx, dy = x - center_x, y - center_y
-                distance = math.sqrt(dx * dx + dy * dy)
-                angle = math.atan2(dy, dx)
-                
-                # Create flowing pattern
-                wave1 = math.sin(distance * 0.02 + angle * 3) * 0.5 + 0.5
-                wave2 = math.sin(x * 0.01) * math.cos(y * 0.01) * 0.5 + 0.5
-                
-                brightness = int((wave1 * 0.7 + wave2 * 0.3) * 255)
-                brightness = max(0, min(255, brightness))
-                image_array[y, x] = [brightness, brightness, brightness]
-
-        self.original_image = pygame.surfarray.make_surface(image_array.swapaxes(0, 1))
+        image_array = patterns.render(DEFAULT_PATTERN, self.window_width, self.window_height, **DEFAULT_PATTERN_PARAMS)
+        self.set_image(image_array)
         self.process_image()
 
-    def load_image(self, image_path):
-        """Load image with smart resizing"""
-        try:
-            pil_image = Image.open(image_path)
-            original_width, original_height = pil_image.size
-            
-            # Smart resizing logic
-            aspect_ratio = original_width / original_height
-            
-            if original_width > MAX_WINDOW_WIDTH or original_height > MAX_WINDOW_HEIGHT:
-                if aspect_ratio > 1:
-                    new_width = MAX_WINDOW_WIDTH
-                    new_height = int(MAX_WINDOW_WIDTH / aspect_ratio)
-                else:
-                    new_height = MAX_WINDOW_HEIGHT
-                    new_width = int(MAX_WINDOW_HEIGHT * aspect_ratio)
-            else:
-                new_width = max(MIN_WINDOW_WIDTH, original_width)
-                new_height = max(MIN_WINDOW_HEIGHT, original_height)
-            
-            self.resize_window(new_width, new_height)
-            pil_image = pil_image.resize((self.window_width, self.window_height), Image.Resampling.LANCZOS)
+    def set_image(self, image_array, digest=None):
+        """Make a (height, width, 3) uint8 array the source image, shared with pygame without a copy
 
-            image_array = np.array(pil_image)
-            if len(image_array.shape) == 2:
-                image_array = np.stack([image_array] * 3, axis=-1)
-            elif image_array.shape[2] == 4:
-                image_array = image_array[:, :, :3]
+        `digest` identifies the source file's contents for the preprocessing cache (None for
+        generated images).
+        """
+        self.image = ImageBuffer(image_array)
+        self.image_digest = digest
+        self.layers.invalidate()
+        self.original_image = self.image.surface
 
-            self.original_image = pygame.surfarray.make_surface(image_array.swapaxes(0, 1))
+    def load_image(self, image_path, size=None):
+        """Load image with smart resizing, or stretched to an explicit (width, height)"""
+        self.stop_video()
+        try:
+            image_array, digest = load_image_array(image_path, size, clamp=not self.headless)
+            self.resize_window(image_array.shape[1], image_array.shape[0])
+            self.set_image(image_array, digest)
             self.process_image()
             return True
         except Exception as e:
             print(f"Error loading image: {e}")
             return False
 
+    def prepare_image(self, image_path, detail, use_luminance, report=None):
+        """Decode, resize and analyze an image without touching effect state (runs off-thread)
+
+        Returns the (image_array, digest, brightness_grid, detail, flow, system) tuple taken by
+        apply_loaded_image, with system None.
+        """
+        report = report or (lambda stage, fraction: None)
+        image_array, digest = load_image_array(image_path, clamp=not self.headless, report=report)
+        height, width = image_array.shape[:2]
+        report("analyzing brightness", 0.8)
+        brightness_grid = cached_brightness_grid(image_array, digest, detail, use_luminance)
+        report("building flow field", 0.9)
+        flow = self.flow_field.compute(brightness_grid, detail, width, height)
+        return image_array, digest, brightness_grid, detail, flow, None
+
+    def start_image_load(self, image_path):
+        """Load an image in the background; update() swaps it in once it is ready"""
+        self.stop_video()
+        detail, use_luminance = self.detail, self.use_luminance
+        count, seed, trail_length, state = self.particle_count, self.seed, self.trail_length, self.particle_state
+
+        def job(report):
+            image_array, digest, brightness_grid, _, flow, _ = self.prepare_image(
+                image_path, detail, use_luminance, report)
+            report("spawning particles", 0.95)
+            height, width = image_array.shape[:2]
+            system = self.create_particle_system(count, width, height, detail, seed, trail_length, state)
+            return image_array, digest, brightness_grid, detail, flow, system
+
+        self.image_loader.start(os.path.basename(image_path), job)
+        print(f"Loading in background: {image_path}")
+
+    def apply_loaded_image(self, loaded):
+        """Swap in a finished background load - image, grid, flow field and particles at once
+
+        A load that brings its own particle system starts over at step 1 with clear trails.
+        Without one (playlist slides) the current particles keep flowing into the new image,
+        unless the window size changed.
+        """
+        image_array, digest, brightness_grid, detail, flow, system = loaded
+        height, width = image_array.shape[:2]
+        resized = (width, height) != (self.window_width, self.window_height)
+        if resized:
+            self.resize_window(width, height)
+        self.set_image(image_array, digest)
+        if detail == self.detail:
+            self.brightness_grid = brightness_grid
+            self.flow_field.vectors, self.flow_field.detail = flow, detail
+        else:
+            # DETAIL changed while loading
+            self.process_image()
+
+        if system is not None:
+            self.set_particle_system(system)
+            self.clear_trails()
+            self.current_step = 1
+        elif resized:
+            self.init_particles()
+            self.clear_trails()
+        print(f"Successfully loaded: {self.image_loader.name}")
+
+    def start_playlist(self, directory, interval=PLAYLIST_INTERVAL):
+        """Cycle through the images of `directory`, every `interval` seconds (0 = keys only)"""
+        try:
+            playlist = Playlist(directory)
+        except OSError as e:
+            print(f"Error opening playlist: {e}")
+            return False
+        if not playlist.paths:
+            print(f"No images found in {directory}")
+            return False
+
+        if self.image_cache is None:
+            self.image_cache = ImageCache(self.prepare_image)
+        self.playlist = playlist
+        self.slideshow = interval > 0
+        self.slideshow_interval = interval
+        print(f"Playlist: {len(playlist.paths)} images from {directory}")
+        self.show_slide(1)
+        return True
+
+    def show_slide(self, step=1):
+        """Move `step` images through the playlist; prefetched images swap in on the next frame"""
+        if self.playlist is None:
+            print("No playlist - set PLAYLIST_DIRECTORY or pass a directory as the first argument")
+            return
+        self.stop_video()
+        path = self.playlist.advance(step)
+        future = self.image_cache.request(path, self.detail, self.use_luminance)
+        self.image_loader.follow(os.path.basename(path), future)
+
+        # Prepare what comes next while this one is on screen
+        for upcoming in self.playlist.upcoming(PLAYLIST_PREFETCH):
+            self.image_cache.request(upcoming, self.detail, self.use_luminance)
+        self.next_slide_time = time.perf_counter() + self.slideshow_interval
+
+    def start_video(self, path):
+        """Stream a video file (or animated image) into the image and brightness grid"""
+        self.stop_video()
+        size = (self.window_width, self.window_height) if self.headless else None
+        try:
+            video = VideoSource(path, size, clamp=not self.headless, detail=self.detail,
+                                luminance=self.use_luminance)
+        except (OSError, ValueError, subprocess.CalledProcessError) as e:
+            print(f"Error opening video: {e}")
+            return False
+
+        self.video = video
+        self.slideshow = False
+        if video.size != (self.window_width, self.window_height):
+            self.resize_window(*video.size)
+            self.init_particles()
+            self.clear_trails()
+        print(f"Streaming video: {path}")
+        return True
+
+    def stop_video(self):
+        if self.video is not None:
+            self.video.close()
+            self.video = None
+
+    def update_video(self):
+        """Apply every video frame that is due: changed grid cells in place, then the newest image
+
+        Offline (headless) playback follows the frame counter and waits for the decoder, so
+        rendered clips never skip frames.
+        """
+        now = self.frame_count / self.fps if self.headless else time.perf_counter()
+        frame, grid_changed = None, False
+        while True:
+            item = self.video.next_due(now, block=self.headless)
+            if item is None:
+                break
+            frame, params, indices, values = item
+            if params != (self.detail, self.use_luminance):
+                continue  # decoded before a DETAIL change, a full grid follows
+            if indices is None:
+                self.brightness_grid = values
+            elif isinstance(self.brightness_grid, np.ndarray) and (indices.size == 0
+                                                                  or indices[-1] < self.brightness_grid.size):
+                if not self.brightness_grid.flags.writeable:
+                    self.brightness_grid = self.brightness_grid.copy()
+                self.brightness_grid.flat[indices] = values
+            else:
+                continue
+            grid_changed = grid_changed or len(values) > 0
+
+        if frame is not None:
+            self.set_image(frame)
+        if grid_changed:
+            self.flow_field.build(self.brightness_grid, self.detail, self.window_width, self.window_height)
+            if self.worker_pool is not None:
+                self.worker_pool.set_grid(self.brightness_grid, self.flow_field.vectors if self.use_flow else None)
+
     def load_image_dialog(self):
         """Image loading dialog"""
         try:
@@ -407,7 +2715,8 @@ class ParticleFlowEffect:
             file_path = filedialog.askopenfilename(
                 title="Select Image File",
                 filetypes=[
-                    ("Image files", "*.jpg *.jpeg *.png *.bmp *.tiff *.tif *.gif *.webp"),
+                    ("Image files", " ".join(f"*{extension}" for extension in IMAGE_EXTENSIONS)),
+                    ("Video files", " ".join(f"*{extension}" for extension in VIDEO_EXTENSIONS)),
                     ("All files", "*.*")
                 ]
             )
@@ -415,21 +2724,19 @@ class ParticleFlowEffect:
             root.destroy()
 
             if file_path:
-                success = self.load_image(file_path)
-                if success:
-                    print(f"Successfully loaded: {os.path.basename(file_path)}")
-                    self.current_step = 1
-                    self.init_particles()
-                    
-                    # Restore window
-                    pygame.display.quit()
-                    pygame.display.init()
-                    self.screen = pygame.display.set_mode((self.window_width, self.window_height))
-                    pygame.display.set_caption("Particle Flow Effect")
-                    return True
+                # Decoding and analysis run in the background, the effect keeps animating
+                if is_video_file(file_path):
+                    self.start_video(file_path)
                 else:
-                    print(f"Failed to load image: {file_path}")
-                    return False
+                    self.start_image_load(file_path)
+
+                # Restore window
+                pygame.display.quit()
+                pygame.display.init()
+                self.screen = pygame.display.set_mode((self.window_width, self.window_height))
+                pygame.display.set_caption("Particle Flow Effect")
+                self.screen_layer = None
+                return True
             else:
                 print("No file selected")
                 return False
@@ -440,39 +2747,199 @@ class ParticleFlowEffect:
 
     def process_image(self):
         """Process image into brightness grid"""
-        if not self.original_image:
+        if self.image is None:
             return
 
-        image_array = pygame.surfarray.array3d(self.original_image)
-        grid_width = self.window_width // DETAIL
-        grid_height = self.window_height // DETAIL
-        
-        self.brightness_grid = np.zeros((grid_height, grid_width), dtype=np.float32)
-
-        for y in range(grid_height):
-            for x in range(grid_width):
-                start_x = x * DETAIL
-                start_y = y * DETAIL
-                end_x = min(start_x + DETAIL, self.window_width)
-                end_y = min(start_y + DETAIL, self.window_height)
-
-                region = image_array[start_x:end_x, start_y:end_y]
-                if region.size > 0:
-                    self.brightness_grid[y, x] = np.mean(region) / 255.0
-                else:
-                    self.brightness_grid[y, x] = 0.5
+        self.brightness_grid = cached_brightness_grid(self.image.array, self.image_digest, self.detail,
+                                                      self.use_luminance)
+        self.flow_field.build(self.brightness_grid, self.detail, self.window_width, self.window_height)
+        self.layers.invalidate()
+        if self.video is not None:
+            self.video.grid_params = (self.detail, self.use_luminance)
+
+    def set_detail(self, detail):
+        """Switch the brightness grid resolution at runtime"""
+        self.detail = max(1, int(detail))
+        if self.particle_system is not None:
+            self.particle_system.detail = self.detail
+        self.process_image()
+        print(f"Grid detail: {self.detail}px")
+
+    def step_detail(self, direction):
+        """Move to the next finer (-1) or coarser (+1) entry in DETAIL_LEVELS"""
+        if direction > 0:
+            levels = [level for level in DETAIL_LEVELS if level > self.detail]
+            target = levels[0] if levels else self.detail
+        else:
+            levels = [level for level in DETAIL_LEVELS if level < self.detail]
+            target = levels[-1] if levels else self.detail
+        if target != self.detail:
+            self.set_detail(target)
+
+    @staticmethod
+    def create_particle_system(count, width, height, detail, seed=None, trail_length=MAX_TRAIL_LENGTH,
+                               state=PARTICLE_STATE):
+        """Particles spread evenly down the window (touches no effect state, safe off-thread)"""
+        y = np.arange(count, dtype=np.float32) / count * height
+        system_class = CompactParticleSystem if state == "fixed" else ParticleSystem
+        system = system_class(count, width, height, y=y, seed=seed, trail_length=trail_length)
+        system.detail = detail
+        return system
 
     def init_particles(self):
         """Initialize particles"""
-        self.particles = []
-        for i in range(PARTICLE_COUNT):
-            y = (i / PARTICLE_COUNT) * self.window_height
-            self.particles.append(Particle(y=y, window_width=self.window_width, window_height=self.window_height))
+        self.set_particle_system(self.create_particle_system(
+            self.particle_count, self.window_width, self.window_height, self.detail, self.seed, self.trail_length,
+            self.particle_state))
+
+    def set_particle_system(self, system):
+        """Make `system` the active particles, moving the worker pool over to it"""
+        if self.worker_pool is not None:
+            self.worker_pool.close()
+            self.worker_pool = None
+        self.particle_system = system
+        if self.worker_count and isinstance(system, ParticleSystem):
+            self.worker_pool = ParticleWorkerPool(self.particle_system, self.worker_count)
+        # Per-particle views for the "Few Particles" step
+        self.particles = self.particle_system.views(20)
+
+    def set_particle_count(self, count):
+        """Grow or shrink the running system without restarting the particles that remain"""
+        self.particle_count = count
+        if self.worker_pool is not None:
+            self.worker_pool.close()
+            self.worker_pool = None
+        self.particle_system.resize(count)
+        self.set_particle_system(self.particle_system)
+
+    def set_trail_length(self, length):
+        self.trail_length = length
+        self.particle_system.trails.resize(max_length=length)
+
+    def set_workers(self, workers):
+        """Switch between main-thread stepping (0) and a pool of worker processes"""
+        if self.worker_pool is not None:
+            self.worker_pool.close()
+            self.worker_pool = None
+        self.worker_count = max(0, workers)
+        if self.worker_count and not isinstance(self.particle_system, ParticleSystem):
+            print("Simulation workers need float32 particle state, stepping on the main thread")
+        elif self.worker_count:
+            self.worker_pool = ParticleWorkerPool(self.particle_system, self.worker_count)
+        print(f"Simulation workers: {self.worker_count or 'off'}")
+
+    def save_snapshot(self, path=SNAPSHOT_PATH):
+        """Write the complete simulation state - particles, trails, image, grid, step - to `path`
+
+        Arrays go into one compressed .npz, the scalar settings into a JSON entry of it.
+        """
+        if self.worker_pool is not None:
+            self.worker_pool.wait()
+        settings = {
+            "version": SNAPSHOT_VERSION,
+            "window_size": [self.window_width, self.window_height],
+            "current_step": self.current_step,
+            "frame_count": self.frame_count,
+            "detail": self.detail,
+            "use_luminance": self.use_luminance,
+            "use_flow": self.use_flow,
+            "enable_3d": self.enable_3d,
+            "show_trails": self.show_trails,
+            "render_backend": self.render_backend,
+            "update_frequency": self.update_frequency,
+            "particle_count": self.particle_count,
+            "trail_length": self.trail_length,
+            "particle_state": self.particle_state,
+            "seed": self.seed,
+            "image_digest": self.image_digest,
+            "trail_frames_since_sweep": self.trail_layer.frames_since_sweep,
+        }
+        arrays = self.particle_system.snapshot()
+        trail_planes = self.trail_layer.planes()
+        trail_colors = list(trail_planes)
+        sprite_trails = np.dstack((pygame.surfarray.array3d(self.persistent_trail_surface),
+                                   pygame.surfarray.array_alpha(self.persistent_trail_surface)))
+        arrays.update(
+            settings=np.array(json.dumps(settings)),
+            image=self.image.array,
+            brightness_grid=np.asarray(self.brightness_grid, dtype=np.float32),
+            flow=self.flow_field.vectors if self.flow_field.vectors is not None else np.zeros((2, 0, 0), np.float32),
+            trail_colors=np.array(trail_colors, dtype=np.uint8).reshape(-1, 3),
+            trail_layers=np.array([trail_planes[color] for color in trail_colors],
+                                  dtype=np.float32).reshape(len(trail_colors), self.window_width * self.window_height),
+            sprite_trails=sprite_trails,
+        )
+        try:
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error saving snapshot: {e}")
+            return False
+        print(f"Snapshot saved: {path}")
+        return True
+
+    def load_snapshot(self, path=SNAPSHOT_PATH):
+        """Restore a save_snapshot() file; the simulation continues exactly where it was saved"""
+        try:
+            with np.load(path) as snapshot:
+                arrays = {name: snapshot[name] for name in snapshot.files}
+            settings = json.loads(str(arrays["settings"]))
+            if settings["version"] != SNAPSHOT_VERSION:
+                raise ValueError(f"unsupported snapshot version {settings['version']}")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading snapshot: {e}")
+            return False
+
+        width, height = settings["window_size"]
+        if not self.headless and not (MIN_WINDOW_WIDTH <= width <= MAX_WINDOW_WIDTH
+                                      and MIN_WINDOW_HEIGHT <= height <= MAX_WINDOW_HEIGHT):
+            print(f"Error loading snapshot: {width}x{height} does not fit the window limits")
+            return False
+        # Nothing may overwrite the restored image and grid afterwards
+        self.stop_video()
+        self.image_loader.cancel()
+        self.slideshow = False
+        if (width, height) != (self.window_width, self.window_height):
+            self.resize_window(width, height)
+
+        self.set_image(arrays["image"], settings["image_digest"])
+        self.detail = settings["detail"]
+        self.use_luminance = settings["use_luminance"]
+        self.brightness_grid = arrays["brightness_grid"]
+        flow = arrays["flow"]
+        self.flow_field.vectors = flow if flow.size else None
+        self.flow_field.detail = self.detail
+        self.particle_count = settings["particle_count"]
+        self.trail_length = settings["trail_length"]
+        self.seed = settings["seed"]
+        self.particle_state = settings["particle_state"]
+        system_class = CompactParticleSystem if self.particle_state == "fixed" else ParticleSystem
+        self.set_particle_system(system_class.restore(arrays))
+
+        self.trail_layer.restore({tuple(int(channel) for channel in color): layer.copy()
+                                  for color, layer in zip(arrays["trail_colors"], arrays["trail_layers"])})
+        self.trail_layer.frames_since_sweep = settings["trail_frames_since_sweep"]
+        sprite_trails = arrays["sprite_trails"]
+        pygame.surfarray.pixels3d(self.persistent_trail_surface)[:] = sprite_trails[:, :, :3]
+        pygame.surfarray.pixels_alpha(self.persistent_trail_surface)[:] = sprite_trails[:, :, 3]
+
+        for name in ("current_step", "frame_count", "use_flow", "enable_3d", "show_trails",
+                     "render_backend", "update_frequency"):
+            setattr(self, name, settings[name])
+        self.layers.invalidate()
+        self.screen_layer = None
+        print(f"Snapshot restored: {path}")
+        return True
 
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 return False
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                # Window contents were lost, repaint in full
+                self.screen_layer = None
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     return False
@@ -481,8 +2948,7 @@ class ParticleFlowEffect:
                 elif event.key == pygame.K_r:
                     self.init_particles()
                     # Clear trails
-                    self.trail_surface.fill((0, 0, 0, 0))
-                    self.persistent_trail_surface.fill((0, 0, 0, 0))
+                    self.clear_trails()
                 elif event.key == pygame.K_l:
                     self.load_image_dialog()
                 elif event.key == pygame.K_3:
@@ -490,94 +2956,185 @@ class ParticleFlowEffect:
                     print(f"3D Effect: {'ON' if self.enable_3d else 'OFF'}")
                 elif event.key == pygame.K_c:
                     # Clear trails manually
-                    self.trail_surface.fill((0, 0, 0, 0))
-                    self.persistent_trail_surface.fill((0, 0, 0, 0))
+                    self.clear_trails()
                     print("Trails cleared")
+                elif event.key == pygame.K_b:
+                    self.render_backend = "sprites" if self.render_backend == "raster" else "raster"
+                    SPRITE_ATLAS.reset_stats()
+                    print(f"Render backend: {self.render_backend}")
+                elif event.key == pygame.K_t:
+                    self.show_trails = not self.show_trails
+                    print(f"Particle trails: {'ON' if self.show_trails else 'OFF'}")
+                elif event.key == pygame.K_f:
+                    self.use_flow = not self.use_flow
+                    print(f"Flow field: {'ON' if self.use_flow else 'OFF'}")
+                elif event.key == pygame.K_w:
+                    self.set_workers(0 if self.worker_count else (os.cpu_count() or 1))
+                elif event.key == pygame.K_q:
+                    self.quality.enabled = not self.quality.enabled
+                    if not self.quality.enabled:
+                        self.quality.restore()
+                    print(f"Adaptive quality: {'ON' if self.quality.enabled else 'OFF'}")
+                elif event.key == pygame.K_p:
+                    self.show_profiler = not self.show_profiler
+                elif event.key == pygame.K_o:
+                    stamp = time.strftime("%Y%m%d_%H%M%S")
+                    self.profiler.dump(f"particle_flow_trace_{stamp}.csv")
+                    self.profiler.dump(f"particle_flow_trace_{stamp}.json")
+                elif event.key == pygame.K_F5:
+                    self.save_snapshot()
+                elif event.key == pygame.K_F9:
+                    self.load_snapshot()
+                elif event.key == pygame.K_RIGHT:
+                    self.show_slide(1)
+                elif event.key == pygame.K_LEFT:
+                    self.show_slide(-1)
+                elif event.key == pygame.K_s:
+                    if self.playlist is not None:
+                        self.slideshow = not self.slideshow
+                        if self.slideshow and self.slideshow_interval <= 0:
+                            self.slideshow_interval = PLAYLIST_INTERVAL
+                        self.next_slide_time = time.perf_counter() + self.slideshow_interval
+                        print(f"Slideshow: {'ON' if self.slideshow else 'OFF'}")
+                elif event.key == pygame.K_LEFTBRACKET:
+                    self.step_detail(-1)
+                elif event.key == pygame.K_RIGHTBRACKET:
+                    self.step_detail(1)
         return True
 
     def update(self):
         """Update loop"""
         self.frame_count += 1
+
+        # Background loads are swapped in here, between two frames
+        loaded = self.image_loader.take()
+        if loaded is not None:
+            self.apply_loaded_image(loaded)
+        if self.video is not None:
+            self.update_video()
+        if self.slideshow and not self.image_loader.busy and time.perf_counter() >= self.next_slide_time:
+            self.show_slide(1)
         
+        if self.current_step in STATIC_STEPS:
+            return
         if self.frame_count % self.update_frequency == 0 and isinstance(self.brightness_grid, np.ndarray) and self.brightness_grid.size > 0:
-            grid_width = self.brightness_grid.shape[1] if len(self.brightness_grid.shape) > 1 else 0
-            grid_height = self.brightness_grid.shape[0] if len(self.brightness_grid.shape) > 0 else 0
-            
-            for particle in self.particles:
-                particle.update(self.brightness_grid, grid_width, grid_height)
+            flow = self.flow_field.vectors if self.use_flow else None
+            if self.worker_pool is not None:
+                # Swap in the frame the workers finished, then start the next one while we draw
+                self.worker_pool.wait()
+                self.worker_pool.submit(self.brightness_grid, flow)
+            else:
+                self.particle_system.update(self.brightness_grid, flow)
 
     def draw_trails(self):
         """Draw trail system"""
-        fade_surface = pygame.Surface((self.window_width, self.window_height), pygame.SRCALPHA)
-        fade_surface.fill((0, 0, 0, int(TRAIL_FADE * 255)))
-        
-        # Apply fade to persistent trail surface
-        self.persistent_trail_surface.blit(fade_surface, (0, 0))
-        
-        # Draw new particle positions to persistent surface
-        for particle in self.particles:
-            if self.enable_3d:
-                offset = int(DEPTH_OFFSET * particle.depth)
-                
-                # Red channel
-                red_surf = pygame.Surface((PARTICLE_SIZE * 2, PARTICLE_SIZE * 2), pygame.SRCALPHA)
-                red_color = (*RED_CHANNEL, max(0, min(255, int(particle.alpha * 100))))
-                pygame.draw.circle(red_surf, red_color, (PARTICLE_SIZE, PARTICLE_SIZE), PARTICLE_SIZE)
-                self.persistent_trail_surface.blit(red_surf, (int(particle.x - PARTICLE_SIZE - offset), int(particle.y - PARTICLE_SIZE)))
-                
-                # Blue channel
-                blue_surf = pygame.Surface((PARTICLE_SIZE * 2, PARTICLE_SIZE * 2), pygame.SRCALPHA)
-                blue_color = (*BLUE_CHANNEL, max(0, min(255, int(particle.alpha * 100))))
-                pygame.draw.circle(blue_surf, blue_color, (PARTICLE_SIZE, PARTICLE_SIZE), PARTICLE_SIZE)
-                self.persistent_trail_surface.blit(blue_surf, (int(particle.x - PARTICLE_SIZE + offset), int(particle.y - PARTICLE_SIZE)))
-            else:
-                color = (*PARTICLE_COLOR, max(0, min(255, int(particle.alpha * 120))))
-                surf = pygame.Surface((PARTICLE_SIZE * 2, PARTICLE_SIZE * 2), pygame.SRCALPHA)
-                pygame.draw.circle(surf, color, (PARTICLE_SIZE, PARTICLE_SIZE), PARTICLE_SIZE)
-                self.persistent_trail_surface.blit(surf, (int(particle.x - PARTICLE_SIZE), int(particle.y - PARTICLE_SIZE)))
+        if self.render_backend == "sprites":
+            # Apply fade to persistent trail surface, then draw new positions in one blits batch
+            self.screen.fill(BACKGROUND_COLOR)
+            self.persistent_trail_surface.blit(self.fade_surface, (0, 0))
+            SPRITE_ATLAS.blit_particles(self.persistent_trail_surface, self.particle_system, self.enable_3d,
+                                        alpha_scale=120, anaglyph_alpha_scale=100)
+            self.screen.blit(self.persistent_trail_surface, (0, 0))
+        else:
+            # Fade and splat in the NumPy trail layer, then upload it over the background
+            self.trail_layer.accumulate(self.particle_system, self.enable_3d)
+            self.trail_layer.present(self.screen, BACKGROUND_COLOR)
 
-        # Draw the persistent trail surface to screen
-        self.screen.blit(self.persistent_trail_surface, (0, 0))
+    def render_image_grid(self):
+        """Static layer for step 1: the source image with the grid overlay"""
+        layer = pygame.Surface((self.window_width, self.window_height))
+        layer.fill(BACKGROUND_COLOR)
+        if self.original_image:
+            layer.blit(self.original_image, (0, 0))
+        for x in range(0, self.window_width, self.detail):
+            pygame.draw.line(layer, GRID_COLOR, (x, 0), (x, self.window_height))
+        for y in range(0, self.window_height, self.detail):
+            pygame.draw.line(layer, GRID_COLOR, (0, y), (self.window_width, y))
+        return layer
+
+    def render_brightness(self):
+        """Static layer for step 2: one flat cell per grid entry, scaled up without filtering"""
+        layer = pygame.Surface((self.window_width, self.window_height))
+        layer.fill(BACKGROUND_COLOR)
+        if isinstance(self.brightness_grid, np.ndarray) and self.brightness_grid.size > 0:
+            grid_height, grid_width = self.brightness_grid.shape
+            gray = (self.brightness_grid * 255).astype(np.uint8)
+            cells = pygame.image.frombuffer(np.repeat(gray[:, :, np.newaxis], 3, axis=2).tobytes(),
+                                            (grid_width, grid_height), "RGB")
+            layer.blit(pygame.transform.scale(cells, (grid_width * self.detail, grid_height * self.detail)), (0, 0))
+        return layer
+
+    def present_layer(self, layer):
+        """Put a static layer on screen; False if it is already there and nothing was drawn"""
+        if layer is self.screen_layer:
+            return False
+        self.screen.blit(layer, (0, 0))
+        self.screen_layer = layer
+        return True
 
     def draw_step_1(self):
-        self.screen.fill(BACKGROUND_COLOR)
-        if self.original_image:
-            self.screen.blit(self.original_image, (0, 0))
-        # Grid overlay
-        for x in range(0, self.window_width, DETAIL):
-            pygame.draw.line(self.screen, (100, 100, 100), (x, 0), (x, self.window_height))
-        for y in range(0, self.window_height, DETAIL):
-            pygame.draw.line(self.screen, (100, 100, 100), (0, y), (self.window_width, y))
+        return self.present_layer(self.layers.get("image_grid", self.render_image_grid))
 
     def draw_step_2(self):
-        self.screen.fill(BACKGROUND_COLOR)
-        if isinstance(self.brightness_grid, np.ndarray) and self.brightness_grid.size > 0:
-            for y in range(self.brightness_grid.shape[0]):
-                for x in range(self.brightness_grid.shape[1]):
-                    brightness = self.brightness_grid[y, x]
-                    color_value = int(brightness * 255)
-                    color = (color_value, color_value, color_value)
-                    rect = pygame.Rect(x * DETAIL, y * DETAIL, DETAIL, DETAIL)
-                    pygame.draw.rect(self.screen, color, rect)
+        return self.present_layer(self.layers.get("brightness", self.render_brightness))
 
     def draw_step_3(self):
         self.screen.fill(BACKGROUND_COLOR)
         for particle in self.particles[:20]:
+            if self.show_trails:
+                particle.draw_trail(self.screen, self.enable_3d)
             particle.draw(self.screen, self.enable_3d)
 
+    def draw_particles(self):
+        """Draw every particle through the active batched back end"""
+        if self.render_backend == "sprites":
+            self.screen.fill(BACKGROUND_COLOR)
+            if self.show_trails:
+                for particle in self.particle_system.views():
+                    particle.draw_trail(self.screen, self.enable_3d)
+            SPRITE_ATLAS.blit_particles(self.screen, self.particle_system, self.enable_3d)
+        else:
+            self.rasterizer.clear()
+            if self.show_trails:
+                self.rasterizer.splat_trails(self.particle_system.trails, self.enable_3d)
+            self.rasterizer.splat_particles(self.particle_system, self.enable_3d)
+            self.rasterizer.present(self.screen, BACKGROUND_COLOR)
+
     def draw_step_4(self):
-        self.screen.fill(BACKGROUND_COLOR)
-        for particle in self.particles:
-            particle.draw(self.screen, self.enable_3d)
+        self.draw_particles()
 
     def draw_step_5(self):
-        self.screen.fill(BACKGROUND_COLOR)
-        for particle in self.particles:
-            particle.draw(self.screen, self.enable_3d)
+        self.draw_particles()
 
     def draw_step_6(self):
-        self.screen.fill(BACKGROUND_COLOR)
-        self.draw_trails()
+        with self.profiler.section("draw_trails"):
+            self.draw_trails()
+
+    def draw_step_7(self):
+        """Particles colored by how many neighbors lie within DENSITY_RADIUS"""
+        system = self.particle_system
+        with self.profiler.section("spatial_hash"):
+            self.spatial_hash.build(system.x, system.y)
+            density = self.spatial_hash.neighbor_counts(DENSITY_RADIUS)
+        # Position along the palette, 0 at the first stop and len - 1 at the last
+        stops = len(DENSITY_PALETTE)
+        position = np.minimum(density / DENSITY_MAX_NEIGHBORS, 1).astype(np.float32) * (stops - 1)
+
+        if self.render_backend == "sprites":
+            self.screen.fill(BACKGROUND_COLOR)
+            levels = np.linspace(0, stops - 1, DENSITY_SPRITE_LEVELS)
+            ramp = [tuple(int(np.interp(level, range(stops), channel)) for channel in zip(*DENSITY_PALETTE))
+                    for level in levels]
+            color_index = np.rint(position * ((DENSITY_SPRITE_LEVELS - 1) / max(1, stops - 1))).astype(np.intp)
+            SPRITE_ATLAS.blit_colored(self.screen, system.x, system.y, system.alpha, ramp, color_index)
+        else:
+            # Each particle splits its alpha between the two nearest stops; additive blending of
+            # the stop layers then reproduces the linear gradient with one layer per stop
+            self.rasterizer.clear()
+            for stop, color in enumerate(DENSITY_PALETTE):
+                weight = np.maximum(1 - np.abs(position - stop), 0)
+                self.rasterizer.splat(system.x, system.y, system.alpha * weight, color)
+            self.rasterizer.present(self.screen, BACKGROUND_COLOR)
 
     def draw(self):
         step_functions = {
@@ -586,32 +3143,78 @@ class ParticleFlowEffect:
             3: self.draw_step_3,
             4: self.draw_step_4,
             5: self.draw_step_5,
-            6: self.draw_step_6
+            6: self.draw_step_6,
+            7: self.draw_step_7
         }
-        step_functions.get(self.current_step, self.draw_step_1)()
+        step = self.current_step if self.current_step in step_functions else 1
+        if step not in STATIC_STEPS:
+            self.screen_layer = None
+        with self.profiler.section(f"draw_step_{step}"):
+            redrawn = step_functions[step]()
+
+        status_text = self.format_status() if self.show_status else None
+        if step in STATIC_STEPS and not redrawn and not self.show_profiler:
+            # Static layer still on screen: at most the status bar changed
+            if status_text == self.status_text:
+                return
+            dirty = []
+            if self.status_rect is not None:
+                self.screen.blit(self.screen_layer, self.status_rect, self.status_rect)
+                dirty.append(self.status_rect)
+            self.draw_status(status_text)
+            if self.status_rect is not None:
+                dirty.append(self.status_rect)
+            with self.profiler.section("display.update"):
+                pygame.display.update(dirty)
+            return
+
+        self.draw_status(status_text)
+        if self.show_profiler:
+            self.profiler.draw_overlay(self.screen, self.profiler_font)
+            self.screen_layer = None  # the overlay changes every frame
 
-        # Status display
+        with self.profiler.section("display.flip"):
+            pygame.display.flip()
+
+    def format_status(self):
+        """Status bar text for the current state"""
         step_descriptions = {
             1: "Original + Grid",
             2: "Brightness", 
             3: "Few Particles",
             4: "All Particles",
             5: "Alpha Blend",
-            6: "Trails"
+            6: "Trails",
+            7: "Density"
         }
         
         step_desc = step_descriptions.get(self.current_step, "Unknown")
         threed_status = " | 3D: ON" if self.enable_3d else ""
+        if self.render_backend == "sprites":
+            threed_status += f" | Atlas: {len(SPRITE_ATLAS.slots)} ({SPRITE_ATLAS.hit_rate:.0%})"
+        if self.quality.downgrades:
+            threed_status += f" | Quality -{len(self.quality.downgrades)}"
+        if self.playlist is not None:
+            threed_status += f" | {self.playlist.index + 1}/{len(self.playlist.paths)}"
+        if self.image_loader.busy:
+            loader = self.image_loader
+            threed_status += f" | Loading {loader.name}: {loader.stage} {loader.progress:.0%}"
         
         # Adaptive text based on window width
         if self.window_width < 800:
             step_text = f"S{self.current_step}/{self.max_steps}: {step_desc}{threed_status}"
         else:
-            step_text = f"Step {self.current_step}/{self.max_steps}: {step_desc}{threed_status} - SPACE/R/L/3/C/ESC"
-        
-        font_size = 24 if self.window_width < 800 else 28
-        font = pygame.font.Font(None, font_size)
-        
+            step_text = f"Step {self.current_step}/{self.max_steps}: {step_desc}{threed_status} - SPACE/R/L/3/C/B/T/F/Q/W/P/O/ESC"
+        return step_text
+
+    def draw_status(self, step_text):
+        """Draw the status bar (None draws nothing) and remember the area it covers"""
+        self.status_text = step_text
+        if step_text is None:
+            self.status_rect = None
+            return
+
+        font = self.small_font if self.window_width < 800 else self.font
         text_surface = font.render(step_text, True, (0, 255, 136))
         text_rect = text_surface.get_rect()
         text_rect.bottomleft = (10, self.window_height - 5)
@@ -621,16 +3224,28 @@ class ParticleFlowEffect:
         pygame.draw.rect(self.screen, (0, 0, 0, 180), bg_rect)
         pygame.draw.rect(self.screen, (0, 255, 136), bg_rect, 2)
         self.screen.blit(text_surface, text_rect)
-
-        pygame.display.flip()
+        self.status_rect = bg_rect.clip(self.screen.get_rect())
 
     def run(self):
         running = True
         while running:
-            running = self.handle_events()
-            self.update()
+            frame_start = time.perf_counter()
+            with self.profiler.section("handle_events"):
+                running = self.handle_events()
+            with self.profiler.section("update"):
+                self.update()
             self.draw()
+            self.profiler.end_frame()
+            # Static steps are nearly free and would only pull quality back up
+            if self.quality.enabled and self.current_step not in STATIC_STEPS:
+                self.quality.record(time.perf_counter() - frame_start)
             self.clock.tick(FPS)
+        if self.worker_pool is not None:
+            self.worker_pool.close()
+        self.stop_video()
+        self.image_loader.close()
+        if self.image_cache is not None:
+            self.image_cache.close()
         pygame.quit()
         sys.exit()
 
@@ -659,11 +3274,20 @@ def main():
         print(f"Calculated window position: {test_x}, {test_y}")
         
         print("Controls:")
-        print("- SPACE: Change effect step (1-6)")
+        print("- SPACE: Change effect step (1-7)")
         print("- R: Reset particles and clear trails")
-        print("- L: Load image")
+        print("- L: Load image or video")
         print("- 3: Toggle 3D red-blue effect")
         print("- C: Clear trails manually")
+        print("- B: Switch render backend (raster/sprites)")
+        print("- [ / ]: Finer / coarser brightness grid")
+        print("- T: Toggle particle trails in steps 3-5")
+        print("- F: Toggle flow-field advection")
+        print("- W: Toggle multi-core simulation workers")
+        print("- P: Toggle frame-time profiler overlay")
+        print("- O: Export profiler trace (CSV + JSON)")
+        print("- LEFT / RIGHT: Previous / next playlist image")
+        print("- S: Toggle playlist slideshow timer")
         print("- ESC: Exit")
         
         effect = ParticleFlowEffect(
@@ -672,7 +3296,16 @@ def main():
             offset_x=offset_x,
             offset_y=offset_y
         )
-        
+
+        source = sys.argv[1] if len(sys.argv) > 1 else PLAYLIST_DIRECTORY
+        if source and os.path.isfile(source):
+            if is_video_file(source):
+                effect.start_video(source)
+            else:
+                effect.start_image_load(source)
+        elif source:
+            effect.start_playlist(source)
+
         effect.run()
         
     except pygame.error as e:
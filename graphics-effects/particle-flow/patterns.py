@@ -0,0 +1,111 @@
+"""Procedural brightness patterns for the particle flow effect
+
+Every pattern is a NumPy function of the pixel coordinate grids returning brightness in 0-1.
+render() turns a pattern into an RGB image and caches it on disk, keyed by pattern name,
+size and parameters, so startup and resizes skip the generation entirely.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# Configuration constants
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "particle-flow", "patterns")
+ENABLE_CACHE = True
+
+
+def _coordinates(width, height):
+    """Pixel coordinate grids, shaped (height, 1) and (1, width) so they broadcast"""
+    y, x = np.ogrid[0:height, 0:width]
+    return x.astype(np.float32), y.astype(np.float32)
+
+
+def spiral(width, height, arms=3, frequency=0.02, wave_frequency=0.01, mix=0.7):
+    """Spiral arms blended with a soft sine/cosine checkerboard (the original default image)"""
+    x, y = _coordinates(width, height)
+    dx, dy = x - width // 2, y - height // 2
+    distance = np.sqrt(dx * dx + dy * dy)
+    angle = np.arctan2(dy, dx)
+
+    wave1 = np.sin(distance * frequency + angle * arms) * 0.5 + 0.5
+    wave2 = np.sin(x * wave_frequency) * np.cos(y * wave_frequency) * 0.5 + 0.5
+    return wave1 * mix + wave2 * (1 - mix)
+
+
+def waves(width, height, frequency=0.02, angle=30.0, count=3):
+    """Interference of `count` plane waves rotated evenly from `angle` degrees"""
+    x, y = _coordinates(width, height)
+    field = np.zeros((height, width), dtype=np.float32)
+    for i in range(count):
+        theta = np.radians(angle + i * 180.0 / count)
+        field += np.sin((x * np.cos(theta) + y * np.sin(theta)) * frequency)
+    return field / (2 * count) + 0.5
+
+
+def noise(width, height, scale=64.0, octaves=4, persistence=0.5, seed=0):
+    """Fractal value noise - smoothly interpolated random lattices summed over octaves"""
+    rng = np.random.default_rng(seed)
+    x, y = _coordinates(width, height)
+    field = np.zeros((height, width), dtype=np.float32)
+    amplitude, total = 1.0, 0.0
+
+    for octave in range(octaves):
+        cell = scale / (2 ** octave)
+        gx, gy = x / cell, y / cell
+        lattice = rng.random((int(gy.max()) + 2, int(gx.max()) + 2), dtype=np.float32)
+
+        x0, y0 = gx.astype(np.int32), gy.astype(np.int32)
+        tx, ty = gx - x0, gy - y0
+        # Smoothstep fade so cell borders are invisible
+        tx, ty = tx * tx * (3 - 2 * tx), ty * ty * (3 - 2 * ty)
+
+        top = lattice[y0, x0] * (1 - tx) + lattice[y0, x0 + 1] * tx
+        bottom = lattice[y0 + 1, x0] * (1 - tx) + lattice[y0 + 1, x0 + 1] * tx
+        field += (top * (1 - ty) + bottom * ty) * amplitude
+
+        total += amplitude
+        amplitude *= persistence
+
+    return field / total
+
+
+PATTERNS = {
+    "spiral": spiral,
+    "waves": waves,
+    "noise": noise,
+}
+
+
+def _cache_path(name, width, height, params):
+    key = json.dumps(params, sort_keys=True)
+    digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+    return os.path.join(CACHE_DIR, f"{name}-{width}x{height}-{digest}.npy")
+
+
+def render(name, width, height, **params):
+    """Render pattern `name` as a (height, width, 3) uint8 grayscale image, cached on disk"""
+    if name not in PATTERNS:
+        raise ValueError(f"Unknown pattern '{name}', choose from: {', '.join(PATTERNS)}")
+
+    path = _cache_path(name, width, height, params)
+    if ENABLE_CACHE and os.path.exists(path):
+        try:
+            return np.load(path)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable pattern cache {path}: {e}")
+
+    brightness = np.clip(PATTERNS[name](width, height, **params) * 255, 0, 255).astype(np.uint8)
+    image_array = np.repeat(brightness[:, :, np.newaxis], 3, axis=2)
+
+    if ENABLE_CACHE:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                np.save(f, image_array)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Could not write pattern cache: {e}")
+
+    return image_array
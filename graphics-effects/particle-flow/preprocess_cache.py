@@ -0,0 +1,98 @@
+"""Content-addressed on-disk cache of preprocessed images for the particle flow effect
+
+Resized RGB buffers and brightness grids are stored as .npy files named after a hash of the
+source file's contents, the target size and (for grids) DETAIL and the luminance mode, so
+re-opening a known image - even after a restart or a rename - skips decoding, resizing and
+grid reduction. Entries are opened with np.load(mmap_mode='c'): pages are read on demand
+and shared with the OS page cache instead of copied into the process, and a write (pygame
+drawing on the image surface, say) copies only the touched pages and never reaches the file.
+
+The cache is capped at MAX_CACHE_BYTES; hits refresh an entry's modification time and the
+oldest entries are evicted first.
+"""
+import hashlib
+import os
+
+import numpy as np
+
+# Configuration constants
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "particle-flow", "images")
+ENABLE_CACHE = True
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# (path, size, mtime) -> digest, so a file is hashed once per session
+_digests = {}
+
+
+def file_digest(path):
+    """Hash of a file's contents (BLAKE2b, 20 bytes hex), memoized by path, size and mtime"""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _digests:
+        digest = hashlib.blake2b(digest_size=20)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        _digests[memo_key] = digest.hexdigest()
+    return _digests[memo_key]
+
+
+def image_name(digest, width, height):
+    return f"{digest}-{width}x{height}.npy"
+
+
+def grid_name(digest, width, height, detail, luminance):
+    mode = "luma" if luminance else "mean"
+    return f"{digest}-{width}x{height}-d{detail}-{mode}.npy"
+
+
+def load(name):
+    """Memory-map a cached array copy-on-write, or None if caching is off or it is missing"""
+    if not ENABLE_CACHE:
+        return None
+    path = os.path.join(CACHE_DIR, name)
+    try:
+        array = np.load(path, mmap_mode="c")
+        os.utime(path)  # mark as recently used for eviction
+        return np.asarray(array)  # plain ndarray view, still backed by the mapping
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable cache entry {path}: {e}")
+        return None
+
+
+def store(name, array):
+    """Write an array atomically, then evict old entries beyond MAX_CACHE_BYTES"""
+    if not ENABLE_CACHE:
+        return
+    path = os.path.join(CACHE_DIR, name)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Could not write preprocessing cache: {e}")
+        return
+    evict()
+
+
+def evict(max_bytes=MAX_CACHE_BYTES):
+    """Delete least recently used entries until the cache fits in `max_bytes`"""
+    try:
+        entries = [entry for entry in os.scandir(CACHE_DIR) if entry.name.endswith(".npy")]
+    except OSError:
+        return
+    stats = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries]
+    total = sum(size for _, size, _ in stats)
+    for _, size, path in sorted(stats):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass  # still mapped elsewhere (Windows) - try again on the next store
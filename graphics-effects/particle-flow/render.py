@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""Headless offline renderer for the particle flow effect
+
+Runs the simulation off-screen (SDL dummy video driver, no Tk) as fast as it can and streams
+frames to a PNG sequence or to an encoder process reading raw RGB on stdin.
+
+    python render.py photo.jpg --step 6 --frames 600 --size 1920x1080 --output clip.mp4
+    python render.py photo.jpg --frames 120 --output frames/
+    python render.py photo.jpg --seed 7 --warmup 3000 --save-snapshot warm.npz --frames 1
+    python render.py --resume warm.npz --frames 600 --output clip.mp4
+    python render.py dance.mp4 --frames 900 --output flow.mp4
+    python render.py photo.jpg --particles 1000000 --fixed-point --frames 300 --output dense.mp4
+"""
+import argparse
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+from PIL import Image
+
+from main import FPS, CompactParticleSystem, ParticleFlowEffect, is_video_file
+
+# Configuration constants
+OUTPUT_VIDEO_EXTENSIONS = (".mp4", ".mkv", ".mov", ".webm")
+DEFAULT_ENCODER = "ffmpeg -loglevel error -y -f rawvideo -pix_fmt rgb24 -s {width}x{height} -r {fps} -i - " \
+                  "-c:v libx264 -pix_fmt yuv420p {output}"
+PROGRESS_INTERVAL = 2.0  # seconds between progress lines
+PNG_COMPRESS_LEVEL = 1  # fast zlib level, frames are intermediate files
+PNG_QUEUE_PER_THREAD = 2
+
+
+class PNGSequenceWriter:
+    """Writes frames as frame_00000.png, frame_00001.png, ... into a directory
+
+    PNG compression runs on a thread pool (Pillow releases the GIL while compressing), so
+    encoding overlaps the simulation. At most PNG_QUEUE_PER_THREAD frames per thread are in flight.
+    """
+
+    def __init__(self, directory, threads=None):
+        self.directory = directory
+        self.index = 0
+        self.threads = threads or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=self.threads)
+        self.pending = deque()
+        os.makedirs(directory, exist_ok=True)
+
+    def _save(self, data, size, path):
+        Image.frombytes("RGB", size, data).save(path, compress_level=PNG_COMPRESS_LEVEL)
+
+    def write(self, surface):
+        path = os.path.join(self.directory, f"frame_{self.index:05d}.png")
+        data = pygame.image.tobytes(surface, "RGB")
+        self.pending.append(self.executor.submit(self._save, data, surface.get_size(), path))
+        self.index += 1
+        while len(self.pending) > self.threads * PNG_QUEUE_PER_THREAD:
+            self.pending.popleft().result()
+
+    def close(self):
+        while self.pending:
+            self.pending.popleft().result()
+        self.executor.shutdown()
+
+
+class EncoderError(RuntimeError):
+    """The encoder process exited early or with a failure status"""
+
+
+class EncoderPipeWriter:
+    """Pipes raw RGB24 frames into an encoder command (ffmpeg by default)
+
+    The encoder's stderr goes to a temporary file, so a failure can be reported with its own
+    messages; after a successful run they are passed on to our stderr.
+    """
+
+    def __init__(self, command):
+        self.errors = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(shlex.split(command), stdin=subprocess.PIPE, stderr=self.errors)
+
+    def write(self, surface):
+        try:
+            self.process.stdin.write(pygame.image.tobytes(surface, "RGB"))
+        except BrokenPipeError:
+            raise self._failure("stopped reading frames and exited") from None
+
+    def close(self):
+        try:
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                pass  # the exit status below says why
+            if self.process.wait() != 0:
+                raise self._failure()
+            sys.stderr.write(self._messages())
+        finally:
+            self.errors.close()
+
+    def _messages(self):
+        self.errors.seek(0)
+        return self.errors.read().decode(errors="replace")
+
+    def _failure(self, what="exited"):
+        status = self.process.wait()
+        messages = self._messages().strip()
+        return EncoderError(f"Encoder {what} with status {status}" + (f": {messages}" if messages else ""))
+
+
+def parse_size(value):
+    try:
+        width, height = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got '{value}'")
+    return width, height
+
+
+def create_writer(args, width, height):
+    if args.encoder or args.output.lower().endswith(OUTPUT_VIDEO_EXTENSIONS):
+        command = (args.encoder or DEFAULT_ENCODER).format(
+            width=width, height=height, fps=args.fps, output=shlex.quote(args.output)
+        )
+        return EncoderPipeWriter(command)
+    return PNGSequenceWriter(args.output)
+
+
+def render(args):
+    effect = ParticleFlowEffect(headless=True, size=args.size)
+    effect.fps = args.fps
+    if args.resume:
+        # Particles, trails, image and settings all come from the snapshot
+        if not effect.load_snapshot(args.resume):
+            return 1
+    else:
+        if args.particles:
+            effect.particle_count = args.particles
+        if args.fixed_point:
+            effect.particle_state = "fixed"
+        if args.image and is_video_file(args.image):
+            # Frames follow the render frame counter, one video second per --fps rendered frames
+            if not effect.start_video(args.image):
+                return 1
+        elif args.image and not effect.load_image(args.image, size=args.size):
+            return 1
+        effect.seed = args.seed
+        effect.init_particles()
+        effect.current_step = 6
+    if args.step is not None:
+        effect.current_step = args.step
+    if args.enable_3d:
+        effect.enable_3d = True
+    effect.show_status = False
+
+    # Let trails and particle distribution settle before recording
+    for _ in range(args.warmup):
+        effect.update()
+        effect.draw()
+
+    try:
+        writer = create_writer(args, effect.window_width, effect.window_height)
+    except OSError as e:
+        hint = "check the --encoder command" if args.encoder else "install ffmpeg (it must be on PATH) or pass --encoder"
+        print(f"Could not start the encoder: {e} - {hint}")
+        effect.stop_video()
+        if effect.worker_pool is not None:
+            effect.worker_pool.close()
+        pygame.quit()
+        return 1
+    start = last_report = time.perf_counter()
+    failure = None
+    try:
+        for frame in range(args.frames):
+            effect.update()
+            effect.draw()
+            writer.write(effect.screen)
+
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                print(f"Frame {frame + 1}/{args.frames} - {(frame + 1) / (now - start):.1f} frames/s")
+    except EncoderError as e:
+        failure = e
+    finally:
+        try:
+            writer.close()
+        except EncoderError as e:
+            failure = failure or e
+        effect.stop_video()
+        if args.save_snapshot:
+            effect.save_snapshot(args.save_snapshot)
+        if effect.worker_pool is not None:
+            effect.worker_pool.close()
+        pygame.quit()
+
+    if failure is not None:
+        print(f"Encoding failed: {failure}")
+        return 1
+    elapsed = time.perf_counter() - start
+    print(f"Rendered {args.frames} frames at {effect.window_width}x{effect.window_height} "
+          f"in {elapsed:.1f}s ({args.frames / elapsed:.1f} frames/s) -> {args.output}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the particle flow effect headlessly to frames or video")
+    parser.add_argument("image", nargs="?", help="source image or video (default: procedural pattern)")
+    parser.add_argument("--step", type=int, choices=range(1, 8),
+                        help="visualization step (default: 6, or the step stored in --resume)")
+    parser.add_argument("--frames", type=int, default=300, help="number of frames to record")
+    parser.add_argument("--size", type=parse_size, default=(1920, 1080), help="resolution as WIDTHxHEIGHT")
+    parser.add_argument("--output", default="frames", help="PNG directory, or a video file (.mp4/.mkv/.mov/.webm)")
+    parser.add_argument("--encoder", help="encoder command reading raw RGB24 on stdin; "
+                                          "{width}, {height}, {fps} and {output} are substituted")
+    parser.add_argument("--fps", type=int, default=FPS, help="frame rate written into video output")
+    parser.add_argument("--warmup", type=int, default=0, help="frames to simulate before recording")
+    parser.add_argument("--3d", dest="enable_3d", action="store_true", help="render the red/blue anaglyph effect")
+    parser.add_argument("--particles", type=int, help="particle count (default: PARTICLE_COUNT)")
+    parser.add_argument("--fixed-point", action="store_true",
+                        help="compact fixed-point particle state for very large particle counts")
+    parser.add_argument("--seed", type=int, help="particle seed, identical seeds render identical frames")
+    parser.add_argument("--resume", metavar="SNAPSHOT", help="continue from a snapshot instead of starting fresh")
+    parser.add_argument("--save-snapshot", metavar="PATH", help="write a snapshot after the last frame")
+    args = parser.parse_args()
+    if args.fixed_point and not args.resume and max(args.size) >= CompactParticleSystem.MAX_EXTENT:
+        parser.error(f"--fixed-point supports sizes up to {CompactParticleSystem.MAX_EXTENT - 1} px per side")
+    return render(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())